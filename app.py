@@ -3,11 +3,36 @@ os.environ["STREAMLIT_SERVER_ENABLE_FILE_WATCHER"] = "false"
 
 
 from chatbot_backend import query_vector_db as get_chatbot_response
+from image_cache import ThumbnailCache, first_image_url
 import streamlit as st
 import io # Import io module for handling uploaded file as bytes
 
 import pandas as pd
 
+CATALOG_CSV = "marketing_sample_for_amazon_com-ecommerce__20200101_20200131__10k_data.csv"
+
+
+@st.cache_resource
+def get_thumbnail_cache():
+    # One LRU per process, shared across sessions and reruns
+    return ThumbnailCache()
+
+
+@st.cache_data
+def load_catalog():
+    return pd.read_csv(CATALOG_CSV)
+
+
+def product_image(catalog_df, product_id, size, img_idx=None):
+    """Local thumbnail bytes of the matched image if available, else its remote URL"""
+    # Pinecone returns numeric metadata as floats
+    img_idx = int(img_idx) if img_idx is not None else None
+    thumbnail = get_thumbnail_cache().get(product_id, size, img_idx)
+    if thumbnail is not None:
+        return thumbnail
+    image_field = catalog_df[catalog_df['Uniq Id'] == product_id]['Image']
+    return first_image_url(image_field.values[0], img_idx) if not image_field.empty else None
+
 # --- Page Config ---
 st.set_page_config(page_title="Search a Product from Amazon", layout="wide")
 
@@ -168,13 +193,9 @@ if search:
 
         # Determine the type of query and call the backend
         response = get_chatbot_response(text=text_query, image=image_stream)
-        preprocessed_df=pd.read_csv("marketing_sample_for_amazon_com-ecommerce__20200101_20200131__10k_data.csv")
-        product_id_url=response['retrieved_items'][5]['product_id']
-        image_url=preprocessed_df[preprocessed_df['Uniq Id']==product_id_url]['Image']
-        if not image_url.empty:
-            response["image_url"] = image_url.values[0]
-        else:
-            response["image_url"] = None
+        preprocessed_df=load_catalog()
+        top_item=response['retrieved_items'][5]
+        response["image_url"] = product_image(preprocessed_df, top_item['product_id'], 512, top_item['img_idx'])
 
     st.success("✅ Here's what we found:")
     st.markdown("### 💬 Chatbot Response")
@@ -205,10 +226,9 @@ if search:
                     item = items_with_images[i + j]
                     with cols[j]:
                         st.markdown("<div class='product-card'>", unsafe_allow_html=True)
-                        product_id_url = item['product_id']
-                        image_url = preprocessed_df[preprocessed_df['Uniq Id'] == product_id_url]['Image']
-                        if not image_url.empty:
-                            st.image(image_url.values[0], use_container_width=True)
+                        image = product_image(preprocessed_df, item['product_id'], 256, item['img_idx'])
+                        if image is not None:
+                            st.image(image, use_container_width=True)
                         st.markdown(f"**{item['title']}**")
                         st.caption(item["description"])
                         st.markdown("</div>", unsafe_allow_html=True)
@@ -0,0 +1,693 @@
+"""Load-test and benchmark harness for the search and ingestion paths.
+
+Everything external is replaced by a local stand-in so runs are reproducible
+and need no API keys:
+
+- a synthetic catalog with random embeddings (same schema as
+  embeddings/all_embeddings.json)
+- FakeIndex, an in-memory brute-force cosine index with the subset of the
+  Pinecone API that load_vectordb.py and chatbot_backend.py use
+- FakeLLMServer, a local HTTP server that answers Perplexity-style chat
+  completion requests after a configurable latency (optionally failing a
+  fraction of them with 429/5xx), and serves generated JPEGs for the
+  ingestion image downloads
+
+Usage:
+    python benchmark.py --scenario all --products 2000 --concurrency 1 4 16 \
+        --llm-latency-ms 200 --output bench_results.json
+    python benchmark.py --compare bench_results.json --output new.json
+
+Results are written as JSON (bench_results.json by default); --compare exits
+non-zero when throughput or p95 latency regress by more than --tolerance
+against a previous run.
+"""
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import tracemalloc
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from vector_compression import matches_filter
+from embedding_versions import EMBEDDING_DIM, EmbeddingVersion
+from memory_usage import peak_rss_mb
+
+
+# Configuration
+BATCH_SIZE = 100  # Number of items to upsert at once
+CATEGORIES = ["Electronics", "Toys & Games", "Home & Kitchen", "Sports & Outdoors",
+              "Clothing", "Beauty", "Office Products", "Automotive"]
+WORDS = ["wireless", "portable", "kids", "deluxe", "classic", "smart", "mini",
+         "pro", "stainless", "organic", "LED", "waterproof", "set", "kit",
+         "speaker", "puzzle", "bottle", "lamp", "backpack", "charger"]
+
+
+# ----- Synthetic catalog -----
+def make_synthetic_catalog(n_products, images_per_product=2, dim=EMBEDDING_DIM, seed=0,
+                           with_embeddings=True):
+    """Build product rows plus embedding records in the all_embeddings.json schema"""
+    rng = np.random.default_rng(seed)
+    pyrng = random.Random(seed)
+    rows = []
+    embeddings = []
+
+    for i in range(n_products):
+        product_id = hashlib.md5(f"product-{seed}-{i}".encode()).hexdigest()
+        name = " ".join(pyrng.choices(WORDS, k=4)).title()
+        category = pyrng.choice(CATEGORIES)
+        price = f"${pyrng.uniform(5, 500):.2f}"
+
+        rows.append({
+            "Uniq Id": product_id,
+            "Product Name": name,
+            "Category": category,
+            "Selling Price": price,
+            "About Product": " ".join(pyrng.choices(WORDS, k=30)),
+            "Product Specification": " ".join(pyrng.choices(WORDS, k=15)),
+            "Image": "",  # Filled in by the ingestion scenario once the server is up
+        })
+        if not with_embeddings:
+            continue
+        embeddings.append({
+            "product_id": product_id,
+            "text_embedding": rng.standard_normal(dim, dtype=np.float32),
+            "image_embeddings": [rng.standard_normal(dim, dtype=np.float32)
+                                 for _ in range(images_per_product)],
+            "image_paths": [],
+            "metadata": {"name": name, "category": category, "price": price},
+        })
+
+    return rows, embeddings
+
+
+def attach_image_urls(rows, server, images_per_product):
+    """Point each row's pipe-joined Image field at images served by `server`"""
+    for row in rows:
+        row["Image"] = "|".join(server.image_url(f"{row['Uniq Id']}_{i}")
+                                for i in range(images_per_product))
+
+
+def fake_embedding(data, dim=EMBEDDING_DIM):
+    """Deterministic stand-in for a CLIP embedding, derived from a hash of the input"""
+    if isinstance(data, str):
+        data = data.encode()
+    elif hasattr(data, "tobytes"):  # PIL image
+        data = data.tobytes()
+    elif hasattr(data, "read"):  # file-like upload
+        data = data.read()
+    seed = int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+    return np.random.default_rng(seed).standard_normal(dim, dtype=np.float32)
+
+
+def make_jpeg(seed, size=224):
+    """Small solid-colour JPEG used by the fake server and image queries"""
+    from PIL import Image
+
+    rng = random.Random(seed)
+    color = tuple(rng.randrange(256) for _ in range(3))
+    buf = BytesIO()
+    Image.new("RGB", (size, size), color).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+# ----- Fake vector index -----
+class FakeIndex:
+    """In-memory stand-in for a Pinecone index using brute-force cosine search"""
+
+    def __init__(self, dimension=EMBEDDING_DIM):
+        self.dimension = dimension
+        self._ids = []
+        self._metadata = []
+        self._values = []
+        self._positions = {}
+        self._matrix = None
+        self._filter_masks = {}
+        self._lock = threading.Lock()
+
+    def upsert(self, vectors):
+        with self._lock:
+            for v in vectors:
+                values = np.asarray(v["values"], dtype=np.float32)
+                metadata = v.get("metadata", {})
+                if v["id"] in self._positions:
+                    pos = self._positions[v["id"]]
+                    self._values[pos] = values
+                    self._metadata[pos] = metadata
+                else:
+                    self._positions[v["id"]] = len(self._ids)
+                    self._ids.append(v["id"])
+                    self._values.append(values)
+                    self._metadata.append(metadata)
+            self._matrix = None
+            self._filter_masks = {}
+        return {"upserted_count": len(vectors)}
+
+    def _snapshot(self, filter):
+        """Normalized matrix and (cached) filter mask, rebuilt after upserts"""
+        with self._lock:
+            if self._matrix is None:
+                if self._values:
+                    matrix = np.vstack(self._values)
+                    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+                    self._matrix = matrix / np.maximum(norms, 1e-12)
+                else:
+                    self._matrix = np.empty((0, self.dimension), dtype=np.float32)
+            mask = None
+            if filter:
+                key = json.dumps(filter, sort_keys=True)
+                if key not in self._filter_masks:
+                    self._filter_masks[key] = np.array(
+                        [matches_filter(md, filter) for md in self._metadata], dtype=bool)
+                mask = self._filter_masks[key]
+            return self._matrix, mask, self._ids, self._metadata
+
+    def query(self, vector, top_k=10, include_metadata=False, filter=None, **kwargs):
+        matrix, mask, ids, metadata = self._snapshot(filter)
+        q = np.asarray(vector, dtype=np.float32)
+        q = q / max(float(np.linalg.norm(q)), 1e-12)
+
+        scores = matrix @ q
+        candidates = np.arange(len(scores)) if mask is None else np.flatnonzero(mask)
+        if len(candidates) == 0:
+            return {"matches": []}
+        k = min(top_k, len(candidates))
+        top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+
+        matches = []
+        for i in top:
+            match = {"id": ids[i], "score": float(scores[i])}
+            if include_metadata:
+                match["metadata"] = metadata[i]
+            matches.append(match)
+        return {"matches": matches}
+
+    def delete(self, ids=None, delete_all=False):
+        deleted = set(ids or [])
+        with self._lock:
+            keep = [i for i, vector_id in enumerate(self._ids)
+                    if not delete_all and vector_id not in deleted]
+            self._ids = [self._ids[i] for i in keep]
+            self._values = [self._values[i] for i in keep]
+            self._metadata = [self._metadata[i] for i in keep]
+            self._positions = {vector_id: i for i, vector_id in enumerate(self._ids)}
+            self._matrix = None
+            self._filter_masks = {}
+        return {}
+
+    def describe_index_stats(self):
+        return {"dimension": self.dimension, "total_vector_count": len(self._ids)}
+
+
+# ----- Fake LLM server -----
+class FakeLLMServer:
+    """Local Perplexity-compatible chat completions server with injected latency and errors"""
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, answer="both", error_rate=0.0,
+                 error_statuses=(429, 500, 503), host="127.0.0.1", port=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.answer = answer
+        self.error_rate = error_rate
+        self.error_statuses = error_statuses
+        self.request_count = 0
+        self.error_count = 0
+        self._count_lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def chat_url(self):
+        return f"{self.url}/chat/completions"
+
+    def image_url(self, name):
+        return f"{self.url}/images/{name}.jpg"
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, body, content_type):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                self.rfile.read(length)
+                with server._count_lock:
+                    server.request_count += 1
+                delay = server.latency_ms + random.uniform(0, server.jitter_ms)
+                time.sleep(delay / 1000.0)
+                if random.random() < server.error_rate:
+                    with server._count_lock:
+                        server.error_count += 1
+                    status = random.choice(server.error_statuses)
+                    self._send(status, b'{"error": "injected"}', "application/json")
+                    return
+                body = json.dumps({
+                    "choices": [{"message": {"role": "assistant", "content": server.answer}}]
+                }).encode()
+                self._send(200, body, "application/json")
+
+            def do_GET(self):
+                if self.path.startswith("/images/"):
+                    self._send(200, make_jpeg(self.path), "image/jpeg")
+                else:
+                    self._send(404, b"", "text/plain")
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+# ----- Measurement -----
+def summarize_latencies(latencies):
+    """Latency percentiles in milliseconds"""
+    if not latencies:
+        return {}
+    ms = np.asarray(latencies) * 1000.0
+    return {
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p90_ms": float(np.percentile(ms, 90)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+    }
+
+
+def run_load(fn, inputs, concurrency, trace_memory=False):
+    """Call fn on every input with `concurrency` worker threads and collect stats"""
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def timed(arg):
+        start = time.perf_counter()
+        try:
+            fn(arg)
+        except Exception as e:
+            with lock:
+                errors.append(repr(e))
+            return
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+
+    # tracemalloc slows allocation-heavy code down, so it is opt-in
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(timed, inputs))
+    wall = time.perf_counter() - start
+    traced_peak = None
+    if trace_memory:
+        traced_peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(inputs),
+        "errors": len(errors),
+        "sample_errors": errors[:5],
+        "wall_s": wall,
+        "throughput_rps": len(latencies) / wall if wall > 0 else 0.0,
+        "latency": summarize_latencies(latencies),
+        "traced_peak_mb": traced_peak,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+# ----- Scenarios -----
+def use_fake_encoders(*modules):
+    """Swap CLIP embedding functions for hash-based stand-ins on the given modules"""
+    for module in modules:
+        if module.__name__ == "chatbot_backend":
+            module.embed_text = lambda text, state: fake_embedding(text).tolist()
+            module.embed_image = lambda file, state: fake_embedding(file).tolist()
+        else:
+            module.embed_text = fake_embedding
+            module.embed_image = fake_embedding
+
+
+def build_index(embeddings):
+    """Load embedding records into a FakeIndex through load_vectordb.prepare_vectors"""
+    import load_vectordb
+
+    index = FakeIndex()
+    vectors = load_vectordb.prepare_vectors(embeddings, index)
+    for i in range(0, len(vectors), BATCH_SIZE):
+        index.upsert(vectors=vectors[i:i + BATCH_SIZE])
+    return index
+
+
+def bench_search(args, server):
+    """Drive chatbot_backend.query_vector_db against FakeIndex and FakeLLMServer"""
+    import chatbot_backend
+
+    rows, embeddings = make_synthetic_catalog(args.products, args.images_per_product, seed=args.seed)
+    index = build_index(embeddings)
+    # Serve the synthetic catalog as the legacy version and never switch away from it
+    version = EmbeddingVersion.legacy()
+    chatbot_backend.VERSION_CHECK_INTERVAL = float("inf")
+    chatbot_backend.PERPLEXITY_API_URL = server.chat_url
+    chatbot_backend.PERPLEXITY_RATE_LIMIT = args.llm_rate_limit
+    chatbot_backend.llm_client = None
+    if args.encoder == "fake":
+        use_fake_encoders(chatbot_backend)
+        chatbot_backend.search_state = chatbot_backend.SearchState(version, index)
+    else:
+        chatbot_backend.search_state = chatbot_backend.SearchState(
+            version, index, *chatbot_backend.load_clip(version.model))
+
+    rng = random.Random(args.seed)
+    image_bytes = make_jpeg(args.seed)
+    queries = []
+    for _ in range(args.requests):
+        text = rng.choice(rows)["Product Name"]
+        with_image = rng.random() < args.image_fraction
+        queries.append((text, with_image))
+
+    def search(query):
+        text, with_image = query
+        image = BytesIO(image_bytes) if with_image else None
+        response = chatbot_backend.query_vector_db(text=text, image=image)
+        if not response["retrieved_items"]:
+            raise RuntimeError("no items retrieved")
+
+    # Warm-up so model loading / first-touch costs are not measured
+    search(queries[0])
+
+    results = []
+    for concurrency in args.concurrency:
+        before = server.request_count
+        llm_before = dict(chatbot_backend.get_llm_client().stats)
+        print(f"[search] concurrency={concurrency}")
+        stats = run_load(search, queries, concurrency, args.trace_memory)
+        stats["llm_calls"] = server.request_count - before
+        stats["llm_client"] = {key: value - llm_before[key]
+                               for key, value in chatbot_backend.get_llm_client().stats.items()}
+        results.append(stats)
+
+    return {
+        "scenario": "search",
+        "index_vectors": index.describe_index_stats()["total_vector_count"],
+        "runs": results,
+    }
+
+
+def bench_llm(args, server):
+    """Drive llm_client.LLMClient directly to measure coalescing, retries and rate limiting"""
+    from llm_client import LLMClient
+
+    rng = random.Random(args.seed)
+    prompts = [f"Tell me about product {i}" for i in range(args.llm_distinct_prompts)]
+    requests_ = [rng.choice(prompts) for _ in range(args.requests)]
+
+    results = []
+    for concurrency in args.concurrency:
+        print(f"[llm] concurrency={concurrency}")
+        client = LLMClient(api_key="benchmark", url=server.chat_url,
+                           rate_limit=args.llm_rate_limit, backoff=0.05, max_backoff=0.5)
+        before = server.request_count
+        stats = run_load(lambda prompt: client.chat([{"role": "user", "content": prompt}]),
+                         requests_, concurrency, args.trace_memory)
+        stats["server_requests"] = server.request_count - before
+        stats["llm_client"] = dict(client.stats)
+        stats["circuit_state"] = client.breaker.state
+        results.append(stats)
+
+    return {"scenario": "llm", "runs": results}
+
+
+def bench_ingest(args, server):
+    """Drive the preprocess.py embedding stage and load_vectordb upload path"""
+    import pandas as pd
+    import preprocess
+
+    rows, _ = make_synthetic_catalog(args.products, args.images_per_product, seed=args.seed)
+    attach_image_urls(rows, server, args.images_per_product)
+    if args.encoder == "fake":
+        use_fake_encoders(preprocess)
+    else:
+        preprocess.load_clip()
+
+    results = []
+    for concurrency in args.concurrency:
+        print(f"[ingest] concurrency={concurrency}")
+        with tempfile.TemporaryDirectory() as image_dir:
+            preprocess.IMAGE_DIR = image_dir
+            preprocess.THUMBNAIL_DIR = os.path.join(image_dir, "thumbnails")
+
+            start = time.perf_counter()
+            df = preprocess.preprocess_catalog(pd.DataFrame(rows))
+            preprocess_s = time.perf_counter() - start
+
+            records = [row for _, row in df.iterrows()]
+            embeddings = []
+            stats = run_load(lambda row: embeddings.append(preprocess.generate_embeddings(row)),
+                             records, concurrency, args.trace_memory)
+
+            start = time.perf_counter()
+            index = build_index(embeddings)
+            upload_s = time.perf_counter() - start
+
+        stats["products_per_s"] = stats.pop("throughput_rps")
+        stats["preprocess_s"] = preprocess_s
+        stats["upload_s"] = upload_s
+        stats["index_vectors"] = index.describe_index_stats()["total_vector_count"]
+        results.append(stats)
+
+    return {"scenario": "ingest", "runs": results}
+
+
+def bench_stream(args, server):
+    """Peak RSS of streaming vs whole-file ingestion across catalog sizes"""
+    import pandas as pd
+
+    results = []
+    with tempfile.TemporaryDirectory() as data_dir:
+        for n_products in args.stream_sizes:
+            rows, _ = make_synthetic_catalog(n_products, args.images_per_product, seed=args.seed,
+                                             with_embeddings=False)
+            attach_image_urls(rows, server, args.images_per_product)
+            csv_path = os.path.join(data_dir, f"catalog_{n_products}.csv")
+            pd.DataFrame(rows).to_csv(csv_path, index=False)
+            del rows
+
+            # Each run gets a fresh process; its peak_rss_mb reads VmHWM on
+            # Linux, which (unlike ru_maxrss) does not include this parent's peak
+            for mode in args.stream_modes:
+                print(f"[stream] products={n_products} mode={mode}")
+                cmd = [sys.executable, os.path.abspath(__file__), "--stream-worker", csv_path,
+                       "--worker-mode", mode, "--chunk-size", str(args.chunk_size),
+                       "--encoder", args.encoder]
+                proc = subprocess.run(cmd, capture_output=True, text=True, check=True)
+                results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    return {"scenario": "stream", "runs": results}
+
+
+def stream_worker(args):
+    """Child process for bench_stream: ingest one CSV and print a JSON summary line"""
+    import pandas as pd
+    import preprocess
+
+    if args.encoder == "fake":
+        use_fake_encoders(preprocess)
+    else:
+        preprocess.load_clip()
+
+    csv_path = args.stream_worker
+    with tempfile.TemporaryDirectory() as work_dir:
+        preprocess.IMAGE_DIR = work_dir
+        preprocess.THUMBNAIL_DIR = os.path.join(work_dir, "thumbnails")
+        preprocessed_path = os.path.join(work_dir, "preprocessed_data.csv")
+        embeddings_path = os.path.join(work_dir, "all_embeddings.json")
+
+        start = time.perf_counter()
+        if args.worker_mode == "stream":
+            summary = preprocess.ingest_streaming(csv_path, args.chunk_size,
+                                                  preprocessed_path, embeddings_path)
+            n_products = summary["products"]
+        else:
+            # Mirrors the default (non-streaming) path in preprocess.main()
+            df = preprocess.preprocess_catalog(pd.read_csv(csv_path))
+            df.to_csv(preprocessed_path, index=False)
+            embeddings, _ = preprocess.embed_catalog(df)
+            with open(embeddings_path, "w") as f:
+                json.dump(embeddings, f, indent=2)
+            n_products = len(df)
+        wall = time.perf_counter() - start
+
+    print(json.dumps({
+        "mode": args.worker_mode,
+        "products": n_products,
+        "chunk_size": args.chunk_size if args.worker_mode == "stream" else None,
+        "csv_mb": os.path.getsize(csv_path) / (1024 * 1024),
+        "wall_s": wall,
+        "products_per_s": n_products / wall if wall > 0 else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+    }))
+
+
+# ----- Reporting -----
+def environment_info():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_commit": commit or None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare_reports(baseline, current, tolerance):
+    """Return a list of regressions of `current` against `baseline`"""
+    regressions = []
+
+    def run_key(scenario, run):
+        return (scenario["scenario"], run.get("concurrency"), run.get("products"), run.get("mode"))
+
+    old_runs = {run_key(s, r): r for s in baseline["scenarios"] for r in s["runs"]}
+
+    for scenario in current["scenarios"]:
+        for run in scenario["runs"]:
+            old = old_runs.get(run_key(scenario, run))
+            if old is None:
+                continue
+            label = "@".join(str(part) for part in run_key(scenario, run) if part is not None)
+            rate_key = "throughput_rps" if "throughput_rps" in run else "products_per_s"
+            if run[rate_key] < old[rate_key] * (1 - tolerance):
+                regressions.append(f"{label}: {rate_key} {old[rate_key]:.2f} -> {run[rate_key]:.2f}")
+            old_p95 = old.get("latency", {}).get("p95_ms")
+            new_p95 = run.get("latency", {}).get("p95_ms")
+            if old_p95 and new_p95 and new_p95 > old_p95 * (1 + tolerance):
+                regressions.append(f"{label}: p95_ms {old_p95:.1f} -> {new_p95:.1f}")
+            # Per-run RSS is only meaningful where each run has its own process
+            if scenario["scenario"] == "stream" and old["peak_rss_mb"] and run["peak_rss_mb"]:
+                if run["peak_rss_mb"] > old["peak_rss_mb"] * (1 + tolerance):
+                    regressions.append(f"{label}: peak_rss_mb {old['peak_rss_mb']:.1f} -> "
+                                       f"{run['peak_rss_mb']:.1f}")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", choices=["search", "llm", "ingest", "stream", "all"], default="all")
+    parser.add_argument("--products", type=int, default=1000, help="Synthetic catalog size")
+    parser.add_argument("--images-per-product", type=int, default=2)
+    parser.add_argument("--requests", type=int, default=200, help="Search requests per concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--image-fraction", type=float, default=0.0,
+                        help="Fraction of search queries that also upload an image")
+    parser.add_argument("--llm-latency-ms", type=float, default=100.0)
+    parser.add_argument("--llm-jitter-ms", type=float, default=20.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0,
+                        help="Fraction of LLM requests the fake server fails with 429/5xx")
+    parser.add_argument("--llm-rate-limit", type=float, default=0.0,
+                        help="Client-side LLM requests/second (0 disables the rate limiter)")
+    parser.add_argument("--llm-distinct-prompts", type=int, default=10,
+                        help="Prompt pool size for the llm scenario; smaller means more coalescing")
+    parser.add_argument("--encoder", choices=["fake", "clip"], default="fake",
+                        help="Use hash-based stand-in embeddings or the real CLIP model")
+    parser.add_argument("--stream-sizes", type=int, nargs="+", default=[500, 2000],
+                        help="Catalog sizes for the streaming ingestion memory scenario")
+    parser.add_argument("--stream-modes", nargs="+", choices=["stream", "full"], default=["stream", "full"])
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Rows per chunk in streaming mode")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Also report peak Python allocations via tracemalloc (slower)")
+    parser.add_argument("--output", default="bench_results.json", help="Where to write the JSON report")
+    parser.add_argument("--compare", help="Previous JSON report to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed relative regression before --compare fails")
+    # Internal: used by bench_stream to run one ingestion in a child process
+    parser.add_argument("--stream-worker", help=argparse.SUPPRESS)
+    parser.add_argument("--worker-mode", choices=["stream", "full"], default="stream", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.stream_worker:
+        stream_worker(args)
+        return 0
+
+    report = {"environment": environment_info(), "params": vars(args), "scenarios": []}
+
+    with FakeLLMServer(args.llm_latency_ms, args.llm_jitter_ms,
+                       error_rate=args.llm_error_rate) as server:
+        if args.scenario in ("search", "all"):
+            report["scenarios"].append(bench_search(args, server))
+        if args.scenario in ("llm", "all"):
+            report["scenarios"].append(bench_llm(args, server))
+        if args.scenario in ("ingest", "all"):
+            report["scenarios"].append(bench_ingest(args, server))
+        if args.scenario in ("stream", "all"):
+            report["scenarios"].append(bench_stream(args, server))
+
+    report["peak_rss_mb"] = peak_rss_mb()
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare_reports(baseline, report, args.tolerance)
+        if regressions:
+            print("Regressions detected:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("No regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
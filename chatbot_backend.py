@@ -8,6 +8,9 @@ Original file is located at
 """
 
 # chatbot_backend.py
+import os
+import time
+import threading
 from transformers import (
     CLIPProcessor,
     CLIPModel
@@ -15,122 +18,212 @@ from transformers import (
 from PIL import Image
 import torch
 torch.classes.__path__ = []
-import requests
 import streamlit as st
+from llm_client import DEFAULT_API_URL, LLMClient, LLMError
+from embedding_versions import get_active, get_active_version
 
 
 # ----- Configuration -----
-PINECONE_API_KEY = st.secrets["PINECONE_API_KEY"]
-PERPLEXITY_API_KEY = st.secrets["PERPLEXITY_API_KEY"]
-INDEX_NAME = "multimodal"
+def get_secret(name):
+    """Read a secret from Streamlit secrets, falling back to the environment"""
+    try:
+        return st.secrets[name]
+    except Exception:
+        return os.getenv(name)
+
+PINECONE_API_KEY = get_secret("PINECONE_API_KEY")
+PERPLEXITY_API_KEY = get_secret("PERPLEXITY_API_KEY")
+PERPLEXITY_API_URL = os.getenv("PERPLEXITY_API_URL", DEFAULT_API_URL)
+PERPLEXITY_RATE_LIMIT = float(os.getenv("PERPLEXITY_RATE_LIMIT", "5"))  # Requests/second, 0 disables
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone")  # "pinecone" or "local", for the legacy version
+LOCAL_INDEX_PATH = os.getenv("LOCAL_INDEX_PATH")  # Overrides the legacy version's local index
+VERSION_CHECK_INTERVAL = 30  # Seconds between checks for a newly activated embedding version
+VERSION_RETRY_INTERVAL = 300  # Seconds before a failed switch to the same activation is retried
 device = "cuda" if torch.cuda.is_available() else "cpu"
 print("Loaded Pinecone key:", bool(PINECONE_API_KEY))
 
 
-# ----- Pinecone Initialization -----
-from pinecone import Pinecone
+# ----- Embedding Version: CLIP + Index -----
+class SearchState:
+    """The CLIP model and vector index serving one embedding version
 
-print(PINECONE_API_KEY)
-pc = Pinecone(api_key=PINECONE_API_KEY)
-index = pc.Index(INDEX_NAME)
+    Queries take one SearchState and use it throughout, so the query vector
+    and the index always come from the same embedding space.
+    """
 
+    def __init__(self, version, index, clip_model=None, clip_processor=None):
+        self.version = version
+        self.index = index
+        self.clip_model = clip_model
+        self.clip_processor = clip_processor
 
-# ----- Load CLIP -----
-clip_model = CLIPModel.from_pretrained("openai/clip-vit-base-patch32").to(device)
-clip_processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32")
 
+def open_index(version):
+    """Connect to the vector index of an embedding version and check its dimension"""
+    # Versions built by `embedding_versions.py reembed` record their backend;
+    # only the legacy set is configured through the environment
+    backend = version.backend or VECTOR_BACKEND
+    if backend == "local":
+        from vector_compression import CompressedIndex
 
-def generate_with_perplexity2(prompt):
-    headers = {
-        "Authorization": f"Bearer {PERPLEXITY_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "model": "llama-3.1-sonar-large-128k-online",
-        "messages": [
-            {
-                "role": "system",
-                "content": "You are a helpful product assistant. Please answer whether we need to return 'text', 'image' or 'both' for the given query in our rag system. You answer should just be these values only ['text','image','both']"
-            },
-            {
-                "role": "user",
-                "content": """ Please answer whether we need to return 'text', 'image' or 'both' for the given query in our rag system. You answer should just be these values only ['text','image','both']
-                prompt"""
-            }
-        ],
-        "temperature": 0.7,
-        "max_tokens": 256
-    }
-    
+        path = version.local_index_path
+        if version.backend is None and LOCAL_INDEX_PATH:
+            path = LOCAL_INDEX_PATH
+        index = CompressedIndex.load(path)
+        if index.model and index.model != version.model:
+            raise ValueError(f"Local index was built with {index.model}, expected {version.model}")
+    else:
+        from pinecone import Pinecone
+
+        pc = Pinecone(api_key=PINECONE_API_KEY)
+        index = pc.Index(version.index_name)
+
+    index_dim = index.describe_index_stats()["dimension"]
+    if index_dim != version.dim:
+        raise ValueError(f"Index for {version.version} has dimension {index_dim}, expected {version.dim}")
+    return index
+
+
+def load_clip(model_name):
+    """Load a CLIP model and its processor"""
+    clip_model = CLIPModel.from_pretrained(model_name).to(device)
+    clip_processor = CLIPProcessor.from_pretrained(model_name)
+    return clip_model, clip_processor
+
+
+def load_search_state(version):
+    clip_model, clip_processor = load_clip(version.model)
+    return SearchState(version, open_index(version), clip_model, clip_processor)
+
+
+# Loaded on first use so the module can be imported (e.g. by benchmark.py)
+# with a stand-in SearchState assigned to `search_state` instead.
+search_state = None
+_init_lock = threading.Lock()
+_switch_lock = threading.Lock()
+_switching = False
+_failed_activation = None  # (version, activated_at, failed_at) of the last failed switch
+_last_version_check = time.monotonic()
+
+def get_search_state():
+    """Current SearchState; starts a background switch when a new version is activated"""
+    global search_state
+    if search_state is None:
+        with _init_lock:
+            if search_state is None:
+                search_state = load_search_state(get_active_version())
+    _check_for_new_version()
+    return search_state
+
+def _check_for_new_version():
+    global _switching, _last_version_check
+    with _switch_lock:
+        now = time.monotonic()
+        if _switching or now - _last_version_check < VERSION_CHECK_INTERVAL:
+            return
+        _last_version_check = now
+        try:
+            active, activated_at = get_active()
+        except Exception as e:
+            print(f"Could not read active embedding version: {str(e)}")
+            return
+        if active.version == search_state.version.version:
+            return
+        # A failed switch is retried when the version is activated again, or after a while
+        if (_failed_activation and _failed_activation[:2] == (active.version, activated_at)
+                and now - _failed_activation[2] < VERSION_RETRY_INTERVAL):
+            return
+        _switching = True
+    threading.Thread(target=_switch_version, args=(active, activated_at), daemon=True).start()
+
+def _switch_version(version, activated_at=None):
+    """Load the new model and index off the request path, then swap them in together"""
+    global search_state, _switching, _failed_activation
     try:
-        response = requests.post(
-            "https://api.perplexity.ai/chat/completions",
-            json=payload,
-            headers=headers,
-            timeout=10
-        )
-        response.raise_for_status()
-        return response.json()["choices"][0]["message"]["content"]
-    except requests.exceptions.HTTPError as e:
-        print(f"Perplexity API HTTP Error: {e.response.text}")
-        return "Sorry, I couldn't get a response from the AI assistant."
+        print(f"Loading embedding version {version.version} ({version.model})...")
+        new_state = load_search_state(version)
+        search_state = new_state  # Single reference swap; in-flight queries keep the old state
+        _failed_activation = None
+        print(f"Now serving embedding version {version.version}")
+    except Exception as e:
+        _failed_activation = (version.version, activated_at, time.monotonic())
+        print(f"Failed to switch to embedding version {version.version}: {str(e)}")
+    finally:
+        with _switch_lock:
+            _switching = False
+
+
+# ----- LLM Client -----
+# Shared by all sessions so connections, rate limits and in-flight requests are pooled
+llm_client = None
+
+_llm_lock = threading.Lock()
+
+def get_llm_client():
+    """Return the shared Perplexity client, creating it on first use"""
+    global llm_client
+    with _llm_lock:
+        if llm_client is None:
+            llm_client = LLMClient(
+                api_key=PERPLEXITY_API_KEY,
+                url=PERPLEXITY_API_URL,
+                rate_limit=PERPLEXITY_RATE_LIMIT
+            )
+    return llm_client
+
+def ask_llm(messages):
+    try:
+        return get_llm_client().chat(messages)
+    except LLMError as e:
+        if e.status is not None:
+            print(f"Perplexity API HTTP Error: {e}")
+            return "Sorry, I couldn't get a response from the AI assistant."
+        print(f"Perplexity API error: {str(e)}")
+        return "Sorry, there was an error processing your request."
     except Exception as e:
+        # Never let an unexpected client failure reach the page
         print(f"Perplexity API error: {str(e)}")
         return "Sorry, there was an error processing your request."
 
-return_flag=generate_with_perplexity2("What are the features of the Samsung Galaxy S21?")
 
+def generate_with_perplexity2(prompt):
+    return ask_llm([
+        {
+            "role": "system",
+            "content": "You are a helpful product assistant. Please answer whether we need to return 'text', 'image' or 'both' for the given query in our rag system. You answer should just be these values only ['text','image','both']"
+        },
+        {
+            "role": "user",
+            "content": """ Please answer whether we need to return 'text', 'image' or 'both' for the given query in our rag system. You answer should just be these values only ['text','image','both']
+                prompt"""
+        }
+    ])
 
 
 # ----- Add Perplexity API function -----
 def generate_with_perplexity(prompt):
-    headers = {
-        "Authorization": f"Bearer {PERPLEXITY_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "model": "llama-3.1-sonar-large-128k-online",
-        "messages": [
-            {
-                "role": "system",
-                "content": "You are a helpful product assistant."
-            },
-            {
-                "role": "user",
-                "content": prompt
-            }
-        ],
-        "temperature": 0.7,
-        "max_tokens": 256
-    }
-    
-    try:
-        response = requests.post(
-            "https://api.perplexity.ai/chat/completions",
-            json=payload,
-            headers=headers,
-            timeout=10
-        )
-        response.raise_for_status()
-        return response.json()["choices"][0]["message"]["content"]
-    except requests.exceptions.HTTPError as e:
-        print(f"Perplexity API HTTP Error: {e.response.text}")
-        return "Sorry, I couldn't get a response from the AI assistant."
-    except Exception as e:
-        print(f"Perplexity API error: {str(e)}")
-        return "Sorry, there was an error processing your request."
+    return ask_llm([
+        {
+            "role": "system",
+            "content": "You are a helpful product assistant."
+        },
+        {
+            "role": "user",
+            "content": prompt
+        }
+    ])
 
 # ----- Embedding Functions -----
-def embed_text(text):
-    inputs = clip_processor(text=[text], return_tensors="pt", padding=True).to(device)
+def embed_text(text, state):
+    inputs = state.clip_processor(text=[text], return_tensors="pt", padding=True).to(device)
     with torch.no_grad():
-        return clip_model.get_text_features(**inputs)[0].cpu().numpy().tolist()
+        return state.clip_model.get_text_features(**inputs)[0].cpu().numpy().tolist()
 
-def embed_image(file):
+def embed_image(file, state):
     image = Image.open(file).convert("RGB")
-    inputs = clip_processor(images=image, return_tensors="pt", padding=True).to(device)
+    inputs = state.clip_processor(images=image, return_tensors="pt", padding=True).to(device)
     with torch.no_grad():
-        return clip_model.get_image_features(**inputs)[0].cpu().numpy().tolist()
+        return state.clip_model.get_image_features(**inputs)[0].cpu().numpy().tolist()
 
 # ----- Main Retrieval + Generation Function -----
 
@@ -147,19 +240,20 @@ def query_vector_db(text=None, image=None, return_type="both"):
     if return_type not in ['image','text','both']:
         return_type='both'
         
-    # 1. Embed the input(s)
+    # 1. Embed the input(s) with the model of the version being served
+    state = get_search_state()
     query_vec = None
     query_text = ""
     if text and not image:
-        query_vec = embed_text(text)
+        query_vec = embed_text(text, state)
         query_text = text
     elif image and not text:
-        query_vec = embed_image(image)
+        query_vec = embed_image(image, state)
         query_text = "What is this product?"
     elif text and image:
         # Combine text and image embeddings (optional: use a weighted average or concatenation)
-        text_vec = embed_text(text)
-        image_vec = embed_image(image)
+        text_vec = embed_text(text, state)
+        image_vec = embed_image(image, state)
         query_vec = [(t + i) / 2 for t, i in zip(text_vec, image_vec)]
         query_text = text
 
@@ -176,7 +270,7 @@ def query_vector_db(text=None, image=None, return_type="both"):
     retrieved_items = []
 
     for qtype in query_types:
-        results = index.query(
+        results = state.index.query(
             vector=query_vec,
             top_k=5,
             include_metadata=True,
@@ -0,0 +1,230 @@
+"""Versioned embedding sets and the background re-embedding job.
+
+Every set of stored vectors is tagged with the CLIP model that produced it
+and its dimension. A version lives in embeddings/versions/{version}/ with a
+manifest.json, the all_embeddings.json store, and (for the local backend)
+the compressed index. Its Pinecone index is named after the version.
+
+embeddings/active.json names the version queries are served from. Switching
+is a single atomic file replace, done only once a version is complete;
+chatbot_backend notices the change, loads the new model and index in the
+background and then swaps them in together.
+
+Before any version is activated, the legacy layout is served: the
+"multimodal" index and embeddings/all_embeddings.json, produced by
+CLIP_MODEL_NAME.
+
+Usage:
+    python embedding_versions.py list
+    python embedding_versions.py reembed --model openai/clip-vit-large-patch14 --backend pinecone
+    python embedding_versions.py activate clip-vit-large-patch14-768
+
+`reembed` builds the new version while the current one keeps serving, and
+activates it when done (unless --no-activate).
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+from datetime import datetime
+
+CLIP_MODEL_NAME = "openai/clip-vit-base-patch32"
+EMBEDDING_DIM = 512  # CLIP base model uses 512-dimensional embeddings
+INDEX_NAME = "multimodal"
+EMBEDDINGS_DIR = "embeddings"
+VERSIONS_DIR = os.path.join(EMBEDDINGS_DIR, "versions")
+ACTIVE_PATH = os.path.join(EMBEDDINGS_DIR, "active.json")
+LEGACY_EMBEDDINGS_PATH = os.path.join(EMBEDDINGS_DIR, "all_embeddings.json")
+LEGACY_LOCAL_INDEX_PATH = "vectordb/compressed"
+PINECONE_MAX_NAME_LENGTH = 45
+
+
+def version_id(model, dim):
+    """Stable id for a model/dimension pair, e.g. clip-vit-base-patch32-512"""
+    slug = re.sub(r"[^a-z0-9]+", "-", model.split("/")[-1].lower()).strip("-")
+    return f"{slug}-{dim}"
+
+
+class EmbeddingVersion:
+    """One embedding set: the model and dimension it was built with, and where it lives"""
+
+    def __init__(self, version, model, dim, index_name, embeddings_path, local_index_path,
+                 status="complete", backend=None, created_at=None, products=None):
+        self.version = version
+        self.model = model
+        self.dim = dim
+        self.index_name = index_name
+        self.embeddings_path = embeddings_path
+        self.local_index_path = local_index_path
+        self.status = status
+        self.backend = backend  # "pinecone" or "local"; None for the legacy set
+        self.created_at = created_at
+        self.products = products
+
+    @classmethod
+    def new(cls, model, dim):
+        version = version_id(model, dim)
+        path = os.path.join(VERSIONS_DIR, version)
+        return cls(
+            version, model, dim,
+            index_name=f"{INDEX_NAME}-{version}"[:PINECONE_MAX_NAME_LENGTH].rstrip("-"),
+            embeddings_path=os.path.join(path, "all_embeddings.json"),
+            local_index_path=os.path.join(path, "compressed"),
+            status="building",
+            created_at=time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        )
+
+    @classmethod
+    def legacy(cls):
+        """The unversioned store and index built before versioning existed"""
+        return cls(version_id(CLIP_MODEL_NAME, EMBEDDING_DIM), CLIP_MODEL_NAME, EMBEDDING_DIM,
+                   INDEX_NAME, LEGACY_EMBEDDINGS_PATH, LEGACY_LOCAL_INDEX_PATH)
+
+    @property
+    def manifest_path(self):
+        return os.path.join(VERSIONS_DIR, self.version, "manifest.json")
+
+    def to_dict(self):
+        return dict(vars(self))
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+        _write_json_atomic(self.manifest_path, self.to_dict())
+
+    @classmethod
+    def load(cls, version):
+        legacy = cls.legacy()
+        if version == legacy.version and not os.path.exists(legacy.manifest_path):
+            return legacy
+        with open(os.path.join(VERSIONS_DIR, version, "manifest.json")) as f:
+            return cls(**json.load(f))
+
+
+def _write_json_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def list_versions():
+    if not os.path.isdir(VERSIONS_DIR):
+        return []
+    return [EmbeddingVersion.load(name) for name in sorted(os.listdir(VERSIONS_DIR))
+            if os.path.exists(os.path.join(VERSIONS_DIR, name, "manifest.json"))]
+
+
+def get_active():
+    """(version, activated_at) that queries should be served from; activated_at is None for legacy"""
+    if not os.path.exists(ACTIVE_PATH):
+        return EmbeddingVersion.legacy(), None
+    with open(ACTIVE_PATH) as f:
+        active = json.load(f)
+    return EmbeddingVersion.load(active["version"]), active.get("activated_at")
+
+
+def get_active_version():
+    """The version queries should be served from"""
+    return get_active()[0]
+
+
+def activate(version):
+    """Point serving at a complete version (atomic file replace)"""
+    if isinstance(version, str):
+        version = EmbeddingVersion.load(version)
+    if version.status != "complete":
+        raise ValueError(f"Version {version.version} is {version.status}, not complete")
+    os.makedirs(EMBEDDINGS_DIR, exist_ok=True)
+    # Microsecond timestamp: re-activating a version is always seen as a new activation
+    _write_json_atomic(ACTIVE_PATH, {"version": version.version,
+                                     "activated_at": datetime.now().astimezone().isoformat()})
+    print(f"Activated embedding version {version.version} ({version.model}, dim={version.dim})")
+
+
+# ----- Re-embedding job -----
+def reembed(model, catalog_path, backend="pinecone", chunk_size=1000, do_activate=True, codec="pq"):
+    """Build a complete embedding version for `model` without touching the active one"""
+    import preprocess
+
+    print(f"Loading CLIP model {model}...")
+    preprocess.load_clip(model)
+    dim = preprocess.model.config.projection_dim
+
+    version = EmbeddingVersion.new(model, dim)
+    version.backend = backend
+    if version.version == get_active_version().version:
+        raise ValueError(f"Version {version.version} is already active")
+    version.save()
+    print(f"Building embedding version {version.version} (dim={dim})")
+
+    summary = preprocess.ingest_streaming(catalog_path, chunk_size, preprocessed_path=None,
+                                          embeddings_path=version.embeddings_path)
+    print(f"Embedded {summary['processed']} products ({len(summary['failed_products'])} failed)")
+
+    if backend == "local":
+        from load_vectordb import embeddings_to_vectors, iter_embeddings
+        from vector_compression import CompressedIndex
+
+        # Codebook training needs every vector at once
+        vectors = embeddings_to_vectors(iter_embeddings(version.embeddings_path))
+        index = CompressedIndex.from_vectors(vectors, codec, model=model)
+        index.save(version.local_index_path)
+    else:
+        from load_vectordb import upload_embedding_stream
+
+        # Clears whatever an earlier failed run left in the index, upserts
+        # everything and only returns once the index holds exactly those vectors
+        _, count = upload_embedding_stream(version.embeddings_path, version.index_name, dim)
+        print(f"Uploaded {count} vectors to '{version.index_name}'")
+
+    version.status = "complete"
+    version.products = summary["processed"]
+    version.save()
+    print(f"Version {version.version} complete")
+
+    if do_activate:
+        activate(version)
+    return version
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Manage versioned embedding sets")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("list", help="Show all versions and which one is active")
+
+    job = subparsers.add_parser("reembed", help="Build a new version with another CLIP model")
+    job.add_argument("--model", required=True, help="Hugging Face CLIP model id")
+    job.add_argument("--catalog", default="dataset/preprocessed_data.csv")
+    job.add_argument("--backend", choices=["pinecone", "local"], default="pinecone")
+    job.add_argument("--codec", default="pq", help="Codec for the local backend")
+    job.add_argument("--chunk-size", type=int, default=1000)
+    job.add_argument("--no-activate", action="store_true", help="Build only; activate later")
+
+    switch = subparsers.add_parser("activate", help="Serve queries from a complete version")
+    switch.add_argument("version")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == "list":
+        active = get_active_version()
+        versions = list_versions()
+        if active.version not in {v.version for v in versions}:
+            versions.insert(0, active)
+        for v in versions:
+            marker = "*" if v.version == active.version else " "
+            print(f"{marker} {v.version:40} {v.model:40} dim={v.dim:<5} {v.backend or '-':9} {v.status}")
+    elif args.command == "reembed":
+        reembed(args.model, args.catalog, args.backend, args.chunk_size,
+                do_activate=not args.no_activate, codec=args.codec)
+    else:
+        activate(args.version)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
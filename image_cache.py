@@ -0,0 +1,198 @@
+"""Local thumbnail generation and serving for product images.
+
+preprocess.py downloads product images to dataset/images/{product_id}_{i}.jpg.
+Each image gets WebP thumbnails at THUMBNAIL_SIZES, named
+dataset/thumbnails/{product_id}_{i}_{size}.webp. ThumbnailIndex maps
+product_id -> thumbnails by scanning that directory, so it needs no state of
+its own. ThumbnailCache keeps recently served thumbnail bytes in an LRU so
+result pages render from memory.
+
+Usage (backfill thumbnails for images that are already downloaded):
+    python image_cache.py
+"""
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+IMAGE_DIR = "dataset/images"
+THUMBNAIL_DIR = "dataset/thumbnails"
+THUMBNAIL_SIZES = (128, 256, 512)  # Longest edge in pixels
+WEBP_QUALITY = 80
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+REFRESH_INTERVAL = 30  # Minimum seconds between background thumbnail directory rescans
+PLACEHOLDERS = ['transparent-pixel', 'placeholder', 'no-image']  # Catalog URLs that are not product images
+
+_IMAGE_NAME = re.compile(r"^(?P<product_id>.+)_(?P<img_idx>\d+)\.jpg$")
+_THUMBNAIL_NAME = re.compile(r"^(?P<product_id>.+)_(?P<img_idx>\d+)_(?P<size>\d+)\.webp$")
+
+
+def thumbnail_path(product_id, img_idx, size, thumbnail_dir=THUMBNAIL_DIR):
+    return os.path.join(thumbnail_dir, f"{product_id}_{img_idx}_{size}.webp")
+
+
+def make_thumbnails(image_path, product_id, img_idx, sizes=THUMBNAIL_SIZES,
+                    thumbnail_dir=THUMBNAIL_DIR):
+    """Write WebP thumbnails of one product image, skipping sizes that already exist"""
+    os.makedirs(thumbnail_dir, exist_ok=True)
+    missing = [s for s in sizes if not os.path.exists(thumbnail_path(product_id, img_idx, s, thumbnail_dir))]
+    if not missing:
+        return
+
+    with Image.open(image_path) as image:
+        image = image.convert("RGB")
+        # Largest first so each smaller thumbnail is resized from the previous one
+        for size in sorted(missing, reverse=True):
+            image.thumbnail((size, size))
+            path = thumbnail_path(product_id, img_idx, size, thumbnail_dir)
+            tmp_path = f"{path}.tmp"
+            image.save(tmp_path, format="WEBP", quality=WEBP_QUALITY)
+            os.replace(tmp_path, path)  # Readers never see a half-written file
+
+
+def backfill_thumbnails(image_dir=IMAGE_DIR, thumbnail_dir=THUMBNAIL_DIR, sizes=THUMBNAIL_SIZES):
+    """Generate thumbnails for every downloaded product image that lacks them"""
+    created = 0
+    for name in sorted(os.listdir(image_dir)):
+        match = _IMAGE_NAME.match(name)
+        if not match:
+            continue
+        try:
+            make_thumbnails(os.path.join(image_dir, name), match["product_id"],
+                            int(match["img_idx"]), sizes, thumbnail_dir)
+            created += 1
+        except Exception as e:
+            print(f"Error creating thumbnails for {name}: {str(e)}")
+    return created
+
+
+def is_placeholder(url):
+    return any(placeholder in url.lower() for placeholder in PLACEHOLDERS)
+
+
+def first_image_url(image_field, img_idx=None):
+    """URL of image `img_idx` from the catalog's pipe-joined Image field if usable, else the first usable one"""
+    if not isinstance(image_field, str):
+        return None
+    # Same numbering as preprocess.py's {product_id}_{i}.jpg files
+    urls = [url.strip() for url in image_field.split('|') if url.strip()]
+    if img_idx is not None and 0 <= img_idx < len(urls) and not is_placeholder(urls[img_idx]):
+        return urls[img_idx]
+    for url in urls:
+        if not is_placeholder(url):
+            return url
+    return None
+
+
+class ThumbnailIndex:
+    """product_id -> {img_idx: {size: path}} built from the thumbnail directory"""
+
+    def __init__(self, thumbnail_dir=THUMBNAIL_DIR):
+        self.thumbnail_dir = thumbnail_dir
+        self.entries = {}
+        self.refresh()
+
+    def refresh(self):
+        entries = {}
+        if os.path.isdir(self.thumbnail_dir):
+            for name in os.listdir(self.thumbnail_dir):
+                match = _THUMBNAIL_NAME.match(name)
+                if match:
+                    images = entries.setdefault(match["product_id"], {})
+                    images.setdefault(int(match["img_idx"]), {})[int(match["size"])] = \
+                        os.path.join(self.thumbnail_dir, name)
+        self.entries = entries
+
+    def lookup(self, product_id, size, img_idx=None):
+        """Path of the smallest thumbnail at least `size` px (else the largest), or None
+
+        Without `img_idx` the product's first image is used; a specific
+        `img_idx` with no thumbnail is a miss rather than a different image.
+        """
+        images = self.entries.get(product_id)
+        if not images:
+            return None
+        sizes = images[min(images)] if img_idx is None else images.get(img_idx)
+        if not sizes:
+            return None
+        fitting = [s for s in sizes if s >= size]
+        return sizes[min(fitting) if fitting else max(sizes)]
+
+
+class ThumbnailCache:
+    """Thread-safe LRU of thumbnail bytes, bounded by total size
+
+    A lookup miss starts a background rescan of the thumbnail directory (at
+    most every `refresh_interval` seconds) so thumbnails written after startup
+    are served, without the request waiting for the scan.
+    """
+
+    def __init__(self, index=None, max_bytes=CACHE_MAX_BYTES, refresh_interval=REFRESH_INTERVAL):
+        self.index = index if index is not None else ThumbnailIndex()
+        self.max_bytes = max_bytes
+        self.refresh_interval = refresh_interval
+        self._last_refresh = time.monotonic()
+        self._refreshing = False
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _read(self, path):
+        with self._lock:
+            data = self._items.get(path)
+            if data is not None:
+                self._items.move_to_end(path)
+                self.hits += 1
+                return data
+            self.misses += 1
+
+        with open(path, "rb") as f:
+            data = f.read()
+
+        with self._lock:
+            if path not in self._items and len(data) <= self.max_bytes:
+                self._items[path] = data
+                self._size += len(data)
+                while self._size > self.max_bytes:
+                    _, evicted = self._items.popitem(last=False)
+                    self._size -= len(evicted)
+        return data
+
+    def _refresh_in_background(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._refreshing or now - self._last_refresh < self.refresh_interval:
+                return
+            self._last_refresh = now
+            self._refreshing = True
+        threading.Thread(target=self._refresh, daemon=True).start()
+
+    def _refresh(self):
+        try:
+            self.index.refresh()  # Swaps in the new entries in one assignment
+        except OSError as e:
+            print(f"Error rescanning {self.index.thumbnail_dir}: {str(e)}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def get(self, product_id, size=256, img_idx=None):
+        """Thumbnail bytes for a product, or None when no local thumbnail exists"""
+        path = self.index.lookup(product_id, size, img_idx)
+        if path is None:
+            self._refresh_in_background()
+            return None
+        try:
+            return self._read(path)
+        except OSError:
+            return None
+
+
+if __name__ == "__main__":
+    count = backfill_thumbnails()
+    print(f"Thumbnails available for {count} images in {THUMBNAIL_DIR}")
@@ -0,0 +1,244 @@
+"""Shared client for the Perplexity chat completions API.
+
+One LLMClient is shared by every Streamlit session in the process. It keeps a
+pooled keep-alive requests.Session, limits the request rate with a token
+bucket, retries 429/5xx/connection failures with jittered exponential backoff,
+stops calling a failing upstream for a while (circuit breaker), and coalesces
+identical in-flight requests so concurrent users asking the same thing cost a
+single upstream call.
+"""
+import json
+import time
+import random
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_API_URL = "https://api.perplexity.ai/chat/completions"
+DEFAULT_MODEL = "llama-3.1-sonar-large-128k-online"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """Raised when no completion could be obtained"""
+
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(LLMError):
+    """Raised without calling upstream while the circuit breaker is open"""
+
+
+class TokenBucket:
+    """Token bucket rate limiter: `rate` tokens/second, holding at most `capacity`"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """Open after `failure_threshold` consecutive failures, probe again after `reset_timeout`"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def allow(self):
+        """Whether a request may go upstream; lets a single probe through when half-open"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+
+class _Call:
+    """An in-flight upstream request that identical concurrent callers wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class LLMClient:
+    """Pooled, rate-limited, retrying chat completions client with request coalescing"""
+
+    def __init__(self, api_key, url=DEFAULT_API_URL, model=DEFAULT_MODEL, timeout=10,
+                 rate_limit=5.0, burst=10, max_retries=3, backoff=0.5, max_backoff=8.0,
+                 failure_threshold=5, reset_timeout=30.0, pool_size=20):
+        self.url = url
+        self.model = model
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.rate_limiter = TokenBucket(rate_limit, burst) if rate_limit else None
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        })
+
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {"requests": 0, "coalesced": 0, "upstream_calls": 0,
+                      "retries": 0, "failures": 0, "rejected": 0}
+
+    def _count(self, key, n=1):
+        with self._stats_lock:
+            self.stats[key] += n
+
+    def chat(self, messages, temperature=0.7, max_tokens=256):
+        """Return the assistant message content for `messages`; only ever raises LLMError"""
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens
+        }
+        key = json.dumps(payload, sort_keys=True)
+        self._count("requests")
+
+        # Single-flight: the first caller for a payload does the request,
+        # identical callers arriving meanwhile wait for its result
+        with self._inflight_lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+
+        if not leader:
+            self._count("coalesced")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._post_with_retries(payload)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+            call.done.set()
+        return call.result
+
+    def _post_with_retries(self, payload):
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self._count("retries")
+                self._sleep_before_retry(attempt, last_error)
+
+            if not self.breaker.allow():
+                self._count("rejected")
+                raise CircuitOpenError("LLM circuit breaker is open")
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+
+            # Every attempt that got past allow() must report an outcome, or a
+            # half-open breaker would keep its probe slot forever
+            outcome = None
+            try:
+                self._count("upstream_calls")
+                response = self.session.post(self.url, json=payload, timeout=self.timeout)
+                text = response.text
+                if response.status_code in RETRY_STATUSES:
+                    outcome = "failure"
+                    last_error = LLMError(f"HTTP {response.status_code}: {text}",
+                                          status=response.status_code,
+                                          retry_after=response.headers.get("Retry-After"))
+                    continue
+                # Upstream is healthy; other 4xx won't succeed on retry
+                outcome = "success"
+            except requests.exceptions.RequestException as e:
+                outcome = "failure"
+                last_error = LLMError(f"Request failed: {e}")
+                continue
+            finally:
+                if outcome == "success":
+                    self.breaker.record_success()
+                else:
+                    self.breaker.record_failure()
+
+            if response.status_code >= 400:
+                self._count("failures")
+                raise LLMError(f"HTTP {response.status_code}: {text}",
+                               status=response.status_code)
+
+            try:
+                return response.json()["choices"][0]["message"]["content"]
+            except (ValueError, KeyError, IndexError, TypeError) as e:
+                self._count("failures")
+                raise LLMError(f"Malformed response: {e}")
+
+        self._count("failures")
+        raise last_error
+
+    def _sleep_before_retry(self, attempt, error):
+        """Full-jitter exponential backoff, honouring Retry-After when the server sends it"""
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+        if error is not None and error.retry_after:
+            try:
+                delay = max(delay, min(float(error.retry_after), self.max_backoff))
+            except ValueError:
+                pass
+        time.sleep(delay)
@@ -3,42 +3,103 @@ import json
 import pinecone
 from tqdm import tqdm
 import numpy as np
-from sklearn.metrics import top_k_accuracy_score
 from collections import defaultdict
 import time
+from embedding_versions import EMBEDDING_DIM, INDEX_NAME, get_active_version
 
 # Configuration
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
-INDEX_NAME = "multimodal"
-EMBEDDING_DIM = 512  # CLIP base model uses 512-dimensional embeddings
 BATCH_SIZE = 100  # Number of items to upsert at once
 EVAL_SAMPLE_SIZE = 100  # Number of items to evaluate (set to 0 to skip evaluation)
 print("Loaded Pinecone key:", bool(PINECONE_API_KEY))
 
 
-def initialize_pinecone():
+def initialize_pinecone(index_name=INDEX_NAME, dimension=EMBEDDING_DIM):
     """Initialize Pinecone connection and create index if needed"""
     pc = pinecone.Pinecone(api_key=PINECONE_API_KEY)
     
     # Check if index exists
-    if INDEX_NAME not in pc.list_indexes().names():
-        print(f"Creating new Pinecone index '{INDEX_NAME}'...")
+    if index_name not in pc.list_indexes().names():
+        print(f"Creating new Pinecone index '{index_name}'...")
         pc.create_index(
-            name=INDEX_NAME,
-            dimension=EMBEDDING_DIM,
+            name=index_name,
+            dimension=dimension,
             metric="cosine",
             spec=pinecone.ServerlessSpec(
                 cloud="aws",
                 region="us-east-1"
             )
         )
+        while not pc.describe_index(index_name).status['ready']:
+            time.sleep(1)
         print("Index created successfully!")
     
-    return pc.Index(INDEX_NAME)
+    index = pc.Index(index_name)
+    index_dim = index.describe_index_stats()['dimension']
+    if index_dim != dimension:
+        raise ValueError(f"Index '{index_name}' has dimension {index_dim}, expected {dimension}")
+    return index
 
-def prepare_vectors(embedding_data):
+def item_to_vectors(item):
+    """Pinecone vectors (text + one per image) for a single embedding record"""
+    # Text embedding
+    vectors = [{
+        'id': f"{item['product_id']}_text",
+        'values': item['text_embedding'],
+        'metadata': {**item['metadata'], 'type': 'text'}
+    }]
+    
+    # Image embeddings; img_idx is the image's position in the catalog Image
+    # field (its {product_id}_{i}.jpg file), which skipped images make differ from i
+    image_paths = item.get('image_paths') or []
+    for i, emb in enumerate(item['image_embeddings']):
+        img_idx = i
+        if i < len(image_paths):
+            img_idx = int(os.path.splitext(image_paths[i])[0].rsplit('_', 1)[-1])
+        vectors.append({
+            'id': f"{item['product_id']}_img_{i}",
+            'values': emb,
+            'metadata': {**item['metadata'], 'type': 'image', 'img_idx': img_idx}
+        })
+    return vectors
+
+def embeddings_to_vectors(embedding_data):
+    """Convert embedding data to Pinecone vector format (id, values, metadata)"""
+    vectors = []
+    
+    for item in tqdm(embedding_data, desc="Preparing vectors"):
+        vectors.extend(item_to_vectors(item))
+    
+    return vectors
+
+def iter_embeddings(embeddings_path, read_size=1024 * 1024):
+    """Yield records from a JSON-array embedding store one at a time, without loading the file"""
+    decoder = json.JSONDecoder()
+    with open(embeddings_path) as f:
+        buf = f.read(read_size).lstrip()
+        if not buf.startswith("["):
+            raise ValueError(f"{embeddings_path} is not a JSON array")
+        buf = buf[1:]
+        while True:
+            buf = buf.lstrip().lstrip(",").lstrip()
+            if buf.startswith("]"):
+                return
+            try:
+                item, end = decoder.raw_decode(buf)
+            except json.JSONDecodeError:
+                # Record continues past the buffer (or the file is truncated)
+                more = f.read(read_size)
+                if not more:
+                    raise ValueError(f"{embeddings_path} ends in the middle of a record")
+                buf += more
+                continue
+            yield item
+            buf = buf[end:]
+
+def prepare_vectors(embedding_data, index=None):
     """Convert embedding data to Pinecone vector format - only add if index is empty"""
-    index = initialize_pinecone()
+    if index is None:
+        index = initialize_pinecone()
     stats = index.describe_index_stats()
     
     # Skip ID checking if index is empty (faster)
@@ -47,23 +108,7 @@ def prepare_vectors(embedding_data):
         return []
     
     print("Index is empty - preparing all vectors for upload")
-    vectors = []
-    
-    for item in tqdm(embedding_data, desc="Preparing vectors"):
-        # Text embedding
-        vectors.append({
-            'id': f"{item['product_id']}_text",
-            'values': item['text_embedding'],
-            'metadata': item['metadata']
-        })
-        
-        # Image embeddings
-        for i, emb in enumerate(item['image_embeddings']):
-            vectors.append({
-                'id': f"{item['product_id']}_img_{i}",
-                'values': emb,
-                'metadata': {**item['metadata'], 'img_idx': i}
-            })
+    vectors = embeddings_to_vectors(embedding_data)
     
     print(f"Prepared {len(vectors)} vectors for upload")
     return vectors
@@ -132,22 +177,71 @@ def evaluate_retrieval(index, embeddings, sample_size=100):
     
     return metrics
 
-def main(embeddings_path="embeddings/all_embeddings.json"):
-    """Optimized main function"""
-    # Load embeddings
-    print(f"Loading embeddings from {embeddings_path}...")
-    with open(embeddings_path) as f:
-        embeddings = json.load(f)
-    
+def upload_embeddings(embeddings, index_name=INDEX_NAME, dimension=EMBEDDING_DIM):
+    """Upload embeddings to a Pinecone index of the given dimension, creating it if needed"""
+    if embeddings and len(embeddings[0]['text_embedding']) != dimension:
+        raise ValueError(f"Embeddings have dimension {len(embeddings[0]['text_embedding'])}, "
+                         f"index '{index_name}' expects {dimension}")
+
     # Initialize Pinecone and prepare vectors
-    index = initialize_pinecone()
-    vectors = prepare_vectors(embeddings)  # This now handles all existence checking
+    index = initialize_pinecone(index_name, dimension)
+    vectors = prepare_vectors(embeddings, index)  # This now handles all existence checking
     
     # Only proceed if we have vectors to upsert
     if vectors:
         # Upsert in batches
         for i in tqdm(range(0, len(vectors), BATCH_SIZE), desc="Upserting"):
             index.upsert(vectors=vectors[i:i+BATCH_SIZE])
+    return index
+
+def upload_embedding_stream(embeddings_path, index_name, dimension, timeout=300):
+    """Replace the contents of an index with an embedding store and wait until it holds them all
+
+    Only for an index that is not serving yet (a version being built): it is
+    cleared first, so vectors left by an earlier failed attempt cannot remain.
+    Returns the index and the number of vectors.
+    """
+    index = initialize_pinecone(index_name, dimension)
+    if index.describe_index_stats()['total_vector_count'] > 0:
+        print(f"Clearing vectors left in '{index_name}' by an earlier attempt")
+        index.delete(delete_all=True)
+    batch = []
+    count = 0
+    for item in tqdm(iter_embeddings(embeddings_path), desc="Upserting"):
+        if len(item['text_embedding']) != dimension:
+            raise ValueError(f"Embeddings have dimension {len(item['text_embedding'])}, "
+                             f"index '{index_name}' expects {dimension}")
+        batch.extend(item_to_vectors(item))
+        while len(batch) >= BATCH_SIZE:
+            index.upsert(vectors=batch[:BATCH_SIZE])
+            count += BATCH_SIZE
+            batch = batch[BATCH_SIZE:]
+    if batch:
+        index.upsert(vectors=batch)
+        count += len(batch)
+
+    # Pinecone stats are eventually consistent; only report success once they match
+    deadline = time.monotonic() + timeout
+    while True:
+        total = index.describe_index_stats()['total_vector_count']
+        if total == count:
+            return index, count
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"Index '{index_name}' holds {total} vectors, expected {count}")
+        time.sleep(2)
+
+def main(embeddings_path=None):
+    """Optimized main function"""
+    # Upload the active embedding version unless a store is given explicitly
+    version = get_active_version()
+    embeddings_path = embeddings_path or version.embeddings_path
+
+    # Load embeddings
+    print(f"Loading embeddings from {embeddings_path}...")
+    with open(embeddings_path) as f:
+        embeddings = json.load(f)
+    
+    index = upload_embeddings(embeddings, version.index_name, version.dim)
     
     # Always run evaluation (uses existing index)
     evaluate_retrieval(index, embeddings)
@@ -0,0 +1,29 @@
+"""Process memory measurement shared by preprocess.py and benchmark.py.
+
+Standard library only, so the benchmark can report memory without
+importing the ML stack.
+"""
+import sys
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB (None if unavailable)"""
+    # Linux: VmHWM starts over at exec, whereas ru_maxrss is inherited from
+    # the parent process and would report its peak instead
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and KB on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
@@ -1,4 +1,5 @@
 import os
+import argparse
 import pandas as pd
 import kagglehub
 import requests
@@ -10,44 +11,68 @@ import numpy as np
 import json
 from io import BytesIO
 import time
+from image_cache import is_placeholder, make_thumbnails
+from embedding_versions import CLIP_MODEL_NAME
+from memory_usage import peak_rss_mb
 
-# Create necessary directories
-os.makedirs("dataset/images", exist_ok=True)
-os.makedirs("embeddings", exist_ok=True)
-os.makedirs("vectordb", exist_ok=True)
-
-# Download dataset
-print("Downloading Amazon Product Dataset 2020...")
-path = kagglehub.dataset_download("promptcloud/amazon-product-dataset-2020")
-path = os.path.join(os.path.join(path,"home"),"sdf")
-print(f"Dataset path: {path}")
-
-print("Loading dataset...")
-csv_file = os.listdir(path)[0]
-data_file = os.path.join(path, csv_file)
-df = pd.read_csv(data_file)
-
-# Preprocessing
-print("Preprocessing data...")
-columns_to_use = ['Uniq Id', 'Product Name', 'Category', 'Selling Price', 
-                 'About Product', 'Product Specification', 'Image']
-df = df[[col for col in columns_to_use if col in df.columns]]
-df = df.dropna(subset=['Product Name']).fillna("")
-df['description'] = df['Product Name'] + ' ' + df['About Product'] + ' ' + df['Product Specification']
-df['description'] = df['description'].str.strip()
-
-# Save preprocessed data
-df.to_csv("dataset/preprocessed_data.csv", index=False)
-print(f"Preprocessed data saved with {len(df)} products")
-
-# Load CLIP model with fast processor
-print("Loading CLIP model...")
+# Configuration
+IMAGE_DIR = "dataset/images"
+THUMBNAIL_DIR = "dataset/thumbnails"
+PREPROCESSED_PATH = "dataset/preprocessed_data.csv"
+EMBEDDINGS_PATH = "embeddings/all_embeddings.json"
+CATALOG_COLUMNS = ['Uniq Id', 'Product Name', 'Category', 'Selling Price', 
+                   'About Product', 'Product Specification', 'Image']
+CHUNK_SIZE = 1000  # Rows per chunk in streaming mode
 device = "cuda" if torch.cuda.is_available() else "cpu"
-model = CLIPModel.from_pretrained("openai/clip-vit-base-patch32").to(device)
 
-# Initialize both with use_fast=True
-processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32", use_fast=True)
-tokenizer = processor.tokenizer  # Get the tokenizer from processor
+# CLIP model/processor, populated by load_clip()
+model = None
+processor = None
+tokenizer = None
+
+def download_dataset():
+    """Download the Amazon product dataset and return the path to its CSV"""
+    print("Downloading Amazon Product Dataset 2020...")
+    path = kagglehub.dataset_download("promptcloud/amazon-product-dataset-2020")
+    path = os.path.join(os.path.join(path,"home"),"sdf")
+    print(f"Dataset path: {path}")
+
+    csv_file = os.listdir(path)[0]
+    return os.path.join(path, csv_file)
+
+def preprocess_catalog(df):
+    """Keep the columns we need and build the combined description field"""
+    df = df[[col for col in CATALOG_COLUMNS if col in df.columns]]
+    df = df.dropna(subset=['Product Name'])
+    # Categorical columns (streaming mode) must know "" before it can fill their gaps
+    for col in df.select_dtypes("category").columns:
+        if "" not in df[col].cat.categories:
+            df[col] = df[col].cat.add_categories("")
+    df = df.fillna("")
+    df['description'] = df['Product Name'] + ' ' + df['About Product'] + ' ' + df['Product Specification']
+    df['description'] = df['description'].str.strip()
+    return df
+
+def load_clip(model_name=CLIP_MODEL_NAME):
+    """Load CLIP model with fast processor"""
+    global model, processor, tokenizer
+    model = CLIPModel.from_pretrained(model_name).to(device)
+
+    # Initialize both with use_fast=True
+    processor = CLIPProcessor.from_pretrained(model_name, use_fast=True)
+    tokenizer = processor.tokenizer  # Get the tokenizer from processor
+
+def embed_text(text):
+    """Embed a product text with the CLIP text encoder"""
+    text_inputs = tokenizer(text, return_tensors="pt", padding=True, truncation=True).to(device)
+    with torch.no_grad():
+        return model.get_text_features(**text_inputs).cpu().numpy().flatten()
+
+def embed_image(image):
+    """Embed a PIL image with the CLIP image encoder"""
+    image_inputs = processor(images=image, return_tensors="pt").to(device)
+    with torch.no_grad():
+        return model.get_image_features(**image_inputs).cpu().numpy().flatten()
 
 def download_image(url, product_id, retries=3):
     """Download and save an image with retries"""
@@ -56,7 +81,7 @@ def download_image(url, product_id, retries=3):
             response = requests.get(url, stream=True, timeout=10)
             if response.status_code == 200:
                 img = Image.open(BytesIO(response.content)).convert('RGB')
-                img_path = f"dataset/images/{product_id}.jpg"
+                img_path = os.path.join(IMAGE_DIR, f"{product_id}.jpg")
                 img.save(img_path)
                 return img_path
         except Exception as e:
@@ -98,9 +123,7 @@ def generate_embeddings(row):
     )
     
     # Text embedding
-    text_inputs = tokenizer(enhanced_text, return_tensors="pt", padding=True, truncation=True).to(device)
-    with torch.no_grad():
-        text_embedding = model.get_text_features(**text_inputs).cpu().numpy().flatten()
+    text_embedding = embed_text(enhanced_text)
     
     # Process ALL images
     image_embeddings = []
@@ -111,11 +134,10 @@ def generate_embeddings(row):
         
         for i, url in enumerate(urls):
             # Skip placeholder images
-            if any(placeholder in url.lower() 
-                   for placeholder in ['transparent-pixel', 'placeholder', 'no-image']):
+            if is_placeholder(url):
                 continue
                 
-            img_path = f"dataset/images/{product_id}_{i}.jpg"
+            img_path = os.path.join(IMAGE_DIR, f"{product_id}_{i}.jpg")
             
             # Download image if not already exists
             if not os.path.exists(img_path):
@@ -131,14 +153,19 @@ def generate_embeddings(row):
             if os.path.exists(img_path):
                 try:
                     image = Image.open(img_path)
-                    image_inputs = processor(images=image, return_tensors="pt").to(device)
-                    with torch.no_grad():
-                        img_embedding = model.get_image_features(**image_inputs).cpu().numpy().flatten()
+                    img_embedding = embed_image(image)
                     
                     image_embeddings.append(img_embedding.tolist())
                     image_paths.append(img_path)
                 except Exception as e:
                     print(f"Error processing {img_path}: {str(e)}")
+                    continue
+
+                # WebP thumbnails for the app to serve locally
+                try:
+                    make_thumbnails(img_path, product_id, i, thumbnail_dir=THUMBNAIL_DIR)
+                except Exception as e:
+                    print(f"Error creating thumbnails for {img_path}: {str(e)}")
     
     return {
         "product_id": product_id,
@@ -152,24 +179,142 @@ def generate_embeddings(row):
         }
     }
 
-# Generate embeddings for all products
-print(f"Generating embeddings for {len(df)} products...")
-embeddings = []
-failed_products = []
-
-for _, row in tqdm(df.iterrows(), total=len(df)):
-    try:
-        embedding = generate_embeddings(row)
-        embeddings.append(embedding)
-    except Exception as e:
-        print(f"Failed to process product {row['Uniq Id']}: {str(e)}")
-        failed_products.append(row['Uniq Id'])
-
-# Save results
-with open("embeddings/all_embeddings.json", "w") as f:
-    json.dump(embeddings, f, indent=2)
-
-print(f"\nCompleted! Successfully processed {len(embeddings)} products")
-print(f"Failed to process {len(failed_products)} products")
-if failed_products:
-    print("Failed product IDs:", failed_products)
\ No newline at end of file
+def embed_catalog(df):
+    """Generate embeddings for all products, returning (embeddings, failed ids)"""
+    print(f"Generating embeddings for {len(df)} products...")
+    embeddings = []
+    failed_products = []
+
+    for _, row in tqdm(df.iterrows(), total=len(df)):
+        try:
+            embedding = generate_embeddings(row)
+            embeddings.append(embedding)
+        except Exception as e:
+            print(f"Failed to process product {row['Uniq Id']}: {str(e)}")
+            failed_products.append(row['Uniq Id'])
+
+    return embeddings, failed_products
+
+def iter_catalog_chunks(data_file, chunk_size=CHUNK_SIZE):
+    """Read the catalog CSV in preprocessed chunks, loading only the columns we need"""
+    reader = pd.read_csv(
+        data_file,
+        usecols=lambda col: col in CATALOG_COLUMNS,
+        # Skip type inference; every field is used as text. Category values
+        # repeat across products, so store each distinct path once per chunk
+        dtype={col: "category" if col == "Category" else str for col in CATALOG_COLUMNS},
+        chunksize=chunk_size,
+    )
+    for chunk in reader:
+        yield preprocess_catalog(chunk)
+
+def stream_catalog(data_file, preprocessed_path=PREPROCESSED_PATH, chunk_size=CHUNK_SIZE):
+    """Yield products as plain dicts, appending each chunk to the preprocessed CSV (if given)"""
+    first = True
+    for chunk in iter_catalog_chunks(data_file, chunk_size):
+        if preprocessed_path:
+            chunk.to_csv(preprocessed_path, mode="w" if first else "a", header=first, index=False)
+        first = False
+        # Plain dicts instead of iterrows() avoids building a Series per row
+        yield from chunk.to_dict("records")
+
+def embed_catalog_stream(products, embeddings_path=EMBEDDINGS_PATH):
+    """Embed products from an iterator, writing each record out as soon as it is ready"""
+    processed = 0
+    failed_products = []
+
+    # Same JSON array as embed_catalog() produces, written incrementally
+    with open(embeddings_path, "w") as f:
+        f.write("[\n")
+        for row in tqdm(products, desc="Generating embeddings"):
+            try:
+                embedding = generate_embeddings(row)
+            except Exception as e:
+                print(f"Failed to process product {row['Uniq Id']}: {str(e)}")
+                failed_products.append(row['Uniq Id'])
+                continue
+            if processed:
+                f.write(",\n")
+            json.dump(embedding, f)
+            processed += 1
+        f.write("\n]\n")
+
+    return processed, failed_products
+
+def ingest_streaming(data_file, chunk_size=CHUNK_SIZE,
+                     preprocessed_path=PREPROCESSED_PATH, embeddings_path=EMBEDDINGS_PATH):
+    """Preprocess and embed a catalog of any size with memory bounded by chunk_size"""
+    products = stream_catalog(data_file, preprocessed_path, chunk_size)
+    processed, failed_products = embed_catalog_stream(products, embeddings_path)
+
+    return {
+        "products": processed + len(failed_products),
+        "processed": processed,
+        "failed_products": failed_products,
+        "csv_mb": os.path.getsize(data_file) / (1024 * 1024),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Preprocess the catalog and generate CLIP embeddings")
+    parser.add_argument("--csv", help="Local catalog CSV to use instead of downloading the Kaggle dataset")
+    parser.add_argument("--stream", action="store_true",
+                        help="Read the catalog in chunks so memory stays bounded for large catalogs")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """Run the full preprocessing and embedding pipeline"""
+    args = parse_args(argv)
+
+    # Create necessary directories
+    os.makedirs(IMAGE_DIR, exist_ok=True)
+    os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+    os.makedirs("embeddings", exist_ok=True)
+    os.makedirs("vectordb", exist_ok=True)
+
+    data_file = args.csv or download_dataset()
+
+    if args.stream:
+        print("Loading CLIP model...")
+        load_clip()
+
+        print(f"Streaming catalog in chunks of {args.chunk_size} rows...")
+        summary = ingest_streaming(data_file, args.chunk_size)
+
+        print(f"\nCompleted! Successfully processed {summary['processed']} products")
+        print(f"Failed to process {len(summary['failed_products'])} products")
+        if summary['failed_products']:
+            print("Failed product IDs:", summary['failed_products'])
+        if summary['peak_rss_mb'] is not None:
+            print(f"Peak RSS: {summary['peak_rss_mb']:.1f} MB for {summary['products']} products "
+                  f"({summary['csv_mb']:.1f} MB CSV)")
+        return
+
+    print("Loading dataset...")
+    df = pd.read_csv(data_file)
+
+    # Preprocessing
+    print("Preprocessing data...")
+    df = preprocess_catalog(df)
+
+    # Save preprocessed data
+    df.to_csv(PREPROCESSED_PATH, index=False)
+    print(f"Preprocessed data saved with {len(df)} products")
+
+    print("Loading CLIP model...")
+    load_clip()
+
+    embeddings, failed_products = embed_catalog(df)
+
+    # Save results
+    with open(EMBEDDINGS_PATH, "w") as f:
+        json.dump(embeddings, f, indent=2)
+
+    print(f"\nCompleted! Successfully processed {len(embeddings)} products")
+    print(f"Failed to process {len(failed_products)} products")
+    if failed_products:
+        print("Failed product IDs:", failed_products)
+
+if __name__ == "__main__":
+    main()
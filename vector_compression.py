@@ -0,0 +1,618 @@
+"""Compressed in-memory vector index for the local search path.
+
+Vectors are L2-normalized (cosine similarity == inner product) and kept in
+memory only as compressed codes:
+
+- float16: half-precision copy, 2 bytes/dim
+- int8:    per-dimension scalar quantization, 1 byte/dim
+- pq:      product quantization, 1 byte per sub-vector, scored with
+           asymmetric distance computation (query stays float32, a per-query
+           lookup table replaces the dot products)
+
+Approximate scores pick a shortlist of `top_k * rerank_factor` candidates,
+which is re-scored exactly against the float32 vectors. Those live in a
+memory-mapped .npy file once the index is saved, so only the shortlist rows
+are paged in.
+
+Usage:
+    python vector_compression.py build --codec pq --output vectordb/compressed
+    python vector_compression.py evaluate --codecs float16 int8 pq
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+RERANK_FACTOR = 4  # Shortlist size as a multiple of top_k
+SCORE_BLOCK = 65536  # Rows decoded at a time when scoring
+VECTOR_FIELDS = ("type", "img_idx")  # Metadata that differs between a product's vectors
+
+
+def matches_filter(metadata, filter):
+    """Evaluate the Pinecone metadata filter subset we use ($eq / $in / literal)"""
+    for field, cond in filter.items():
+        value = metadata.get(field)
+        if isinstance(cond, dict):
+            if "$eq" in cond and value != cond["$eq"]:
+                return False
+            if "$in" in cond and value not in cond["$in"]:
+                return False
+        elif value != cond:
+            return False
+    return True
+
+
+def iter_blocks(codes, rows=None):
+    """Yield (start, block) over `codes`, or only its `rows`, SCORE_BLOCK rows at a time"""
+    n = len(codes) if rows is None else len(rows)
+    for start in range(0, n, SCORE_BLOCK):
+        if rows is None:
+            yield start, codes[start:start + SCORE_BLOCK]
+        else:
+            yield start, codes[rows[start:start + SCORE_BLOCK]]
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+# ----- Codecs -----
+class Float32Codec:
+    """Uncompressed baseline"""
+    name = "none"
+
+    def train(self, vectors):
+        return self
+
+    def encode(self, vectors):
+        return np.ascontiguousarray(vectors, dtype=np.float32)
+
+    def scores(self, codes, query, rows=None):
+        if rows is None:
+            return codes @ query
+        out = np.empty(len(rows), dtype=np.float32)
+        for start, block in iter_blocks(codes, rows):
+            out[start:start + SCORE_BLOCK] = block @ query
+        return out
+
+    def state(self):
+        return {}
+
+    def load_state(self, state):
+        return self
+
+
+class Float16Codec(Float32Codec):
+    """Half-precision storage, decoded block by block for scoring"""
+    name = "float16"
+
+    def encode(self, vectors):
+        return np.asarray(vectors, dtype=np.float16)
+
+    def scores(self, codes, query, rows=None):
+        out = np.empty(len(codes) if rows is None else len(rows), dtype=np.float32)
+        for start, block in iter_blocks(codes, rows):
+            out[start:start + SCORE_BLOCK] = block.astype(np.float32) @ query
+        return out
+
+
+class Int8Codec(Float32Codec):
+    """Per-dimension scalar quantization to 256 levels between the trained min and max"""
+    name = "int8"
+
+    def __init__(self):
+        self.vmin = None
+        self.step = None
+
+    def train(self, vectors):
+        self.vmin = vectors.min(axis=0)
+        self.step = np.maximum(vectors.max(axis=0) - self.vmin, 1e-12) / 255.0
+        return self
+
+    def encode(self, vectors):
+        levels = np.clip(np.rint((vectors - self.vmin) / self.step), 0, 255)
+        return (levels - 128).astype(np.int8)
+
+    def scores(self, codes, query, rows=None):
+        # x ~= vmin + (code + 128) * step, so q.x = q.vmin + 128 * q.step + code . (q * step)
+        weights = (query * self.step).astype(np.float32)
+        offset = float(query @ self.vmin + 128.0 * weights.sum())
+        out = np.empty(len(codes) if rows is None else len(rows), dtype=np.float32)
+        for start, block in iter_blocks(codes, rows):
+            out[start:start + SCORE_BLOCK] = block.astype(np.float32) @ weights
+        return out + offset
+
+    def state(self):
+        return {"vmin": self.vmin, "step": self.step}
+
+    def load_state(self, state):
+        self.vmin = state["vmin"]
+        self.step = state["step"]
+        return self
+
+
+def kmeans(data, k, iterations=20, seed=0):
+    """Plain Lloyd's k-means, returning (k, dim) centroids"""
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), size=k, replace=False)].copy()
+    data_sq = (data ** 2).sum(axis=1, keepdims=True)
+
+    for _ in range(iterations):
+        distances = data_sq - 2 * data @ centroids.T + (centroids ** 2).sum(axis=1)
+        assignment = distances.argmin(axis=1)
+        counts = np.bincount(assignment, minlength=k)
+        sums = np.stack([np.bincount(assignment, weights=data[:, d], minlength=k)
+                         for d in range(data.shape[1])], axis=1)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        # Re-seed empty clusters from random points
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            centroids[empty] = data[rng.integers(len(data), size=len(empty))]
+    return centroids
+
+
+class PQCodec(Float32Codec):
+    """Product quantization: `m` sub-vectors, each encoded as one of `ksub` centroids"""
+    name = "pq"
+
+    def __init__(self, m=64, ksub=256, train_size=20000, iterations=20, seed=0):
+        self.m = m
+        self.ksub = ksub
+        self.train_size = train_size
+        self.iterations = iterations
+        self.seed = seed
+        self.codebooks = None  # (m, ksub, dim // m)
+
+    def train(self, vectors):
+        n, dim = vectors.shape
+        if dim % self.m:
+            raise ValueError(f"Dimension {dim} is not divisible by m={self.m}")
+        rng = np.random.default_rng(self.seed)
+        if n > self.train_size:
+            vectors = vectors[rng.choice(n, size=self.train_size, replace=False)]
+        ksub = min(self.ksub, len(vectors))
+
+        sub_dim = dim // self.m
+        self.codebooks = np.stack([
+            kmeans(vectors[:, i * sub_dim:(i + 1) * sub_dim], ksub, self.iterations, self.seed + i)
+            for i in range(self.m)
+        ]).astype(np.float32)
+        return self
+
+    def encode(self, vectors):
+        sub_dim = self.codebooks.shape[2]
+        codes = np.empty((len(vectors), self.m), dtype=np.uint8)
+        for i, codebook in enumerate(self.codebooks):
+            sub = vectors[:, i * sub_dim:(i + 1) * sub_dim]
+            distances = -2 * sub @ codebook.T + (codebook ** 2).sum(axis=1)
+            codes[:, i] = distances.argmin(axis=1)
+        return codes
+
+    def scores(self, codes, query, rows=None):
+        # Asymmetric distance computation: one (m, ksub) table of partial dot
+        # products per query, then each score is m table lookups
+        sub_dim = self.codebooks.shape[2]
+        table = np.einsum("mkd,md->mk", self.codebooks, query.reshape(self.m, sub_dim))
+        out = np.empty(len(codes) if rows is None else len(rows), dtype=np.float32)
+        columns = np.arange(self.m)
+        for start, block in iter_blocks(codes, rows):
+            out[start:start + SCORE_BLOCK] = table[columns, block].sum(axis=1)
+        return out
+
+    def state(self):
+        return {"codebooks": self.codebooks, "m": np.array(self.m), "ksub": np.array(self.ksub)}
+
+    def load_state(self, state):
+        self.codebooks = state["codebooks"]
+        self.m = int(state["m"])
+        self.ksub = int(state["ksub"])
+        return self
+
+
+CODECS = {
+    "none": Float32Codec,
+    "float16": Float16Codec,
+    "int8": Int8Codec,
+    "pq": PQCodec,
+}
+
+
+# ----- Columnar metadata -----
+def factorize(values):
+    """(codes, uniques): the distinct values in first-seen order and a small-int code per value"""
+    positions = {}
+    uniques = []
+    codes = []
+    for value in values:
+        # Type in the key so 1, 1.0 and True stay distinct; lists are compared by content
+        key = (type(value).__name__, json.dumps(value, sort_keys=True)
+               if isinstance(value, (list, dict)) else value)
+        if key not in positions:
+            positions[key] = len(uniques)
+            uniques.append(value)
+        codes.append(positions[key])
+    dtype = np.uint8 if len(uniques) <= 1 << 8 else np.uint16 if len(uniques) <= 1 << 16 else np.int32
+    return np.array(codes, dtype=dtype), uniques
+
+
+def python_bytes(values):
+    """Approximate heap size of a list of str/int/None values"""
+    return sys.getsizeof(values) + sum(sys.getsizeof(v) for v in values)
+
+
+class ColumnarMetadata:
+    """Vector ids and metadata stored per product and per field instead of per vector
+
+    An id is split at its first "_" into the product id and a suffix ("_text",
+    "_img_0", ...). Fields in VECTOR_FIELDS are kept per vector and all other
+    fields once per product, each as an array of codes into its distinct
+    values, so a vector costs a few bytes rather than a dict and an id string.
+    """
+
+    def __init__(self, product_ids, product_rows, suffixes, suffix_codes,
+                 product_fields, vector_fields):
+        self.product_ids = product_ids
+        self.product_rows = product_rows  # Vector row -> position in product_ids
+        self.suffixes = suffixes
+        self.suffix_codes = suffix_codes
+        self.product_fields = product_fields  # name -> (codes per product, uniques)
+        self.vector_fields = vector_fields  # name -> (codes per vector, uniques)
+
+    @classmethod
+    def from_lists(cls, ids, metadata):
+        positions = {}
+        product_metadata = []
+        product_rows = []
+        suffixes = []
+        for vector_id, md in zip(ids, metadata):
+            product_id, sep, suffix = vector_id.partition("_")
+            position = positions.setdefault(product_id, len(positions))
+            if position == len(product_metadata):
+                product_metadata.append({k: v for k, v in md.items() if k not in VECTOR_FIELDS})
+            product_rows.append(position)
+            suffixes.append(sep + suffix)
+
+        names = list(dict.fromkeys(k for md in product_metadata for k in md))
+        suffix_codes, suffix_values = factorize(suffixes)
+        return cls(
+            list(positions),
+            np.array(product_rows, dtype=np.int32),
+            suffix_values,
+            suffix_codes,
+            {name: factorize([md.get(name) for md in product_metadata]) for name in names},
+            {name: factorize([md.get(name) for md in metadata]) for name in VECTOR_FIELDS
+             if any(name in md for md in metadata)},
+        )
+
+    def __len__(self):
+        return len(self.product_rows)
+
+    def id(self, row):
+        return self.product_ids[self.product_rows[row]] + self.suffixes[self.suffix_codes[row]]
+
+    def get(self, row):
+        """Metadata dict of one vector (fields without a value are left out, as in Pinecone)"""
+        product = self.product_rows[row]
+        md = {name: uniques[codes[product]] for name, (codes, uniques) in self.product_fields.items()}
+        md.update({name: uniques[codes[row]] for name, (codes, uniques) in self.vector_fields.items()})
+        return {k: v for k, v in md.items() if v is not None}
+
+    def mask(self, filter):
+        """Boolean mask of the vectors matching a metadata filter, evaluated once per distinct value"""
+        mask = np.ones(len(self), dtype=bool)
+        for field, cond in filter.items():
+            if field in self.vector_fields:
+                codes, uniques = self.vector_fields[field]
+            elif field in self.product_fields:
+                codes, uniques = self.product_fields[field]
+                codes = codes[self.product_rows]
+            else:
+                mask &= matches_filter({}, {field: cond})
+                continue
+            allowed = np.array([matches_filter({field: v}, {field: cond}) for v in uniques], dtype=bool)
+            mask &= allowed[codes]
+        return mask
+
+    def nbytes(self):
+        total = self.product_rows.nbytes + self.suffix_codes.nbytes
+        total += python_bytes(self.product_ids) + python_bytes(self.suffixes)
+        for codes, uniques in list(self.product_fields.values()) + list(self.vector_fields.values()):
+            total += codes.nbytes + python_bytes(uniques)
+        return total
+
+    def state(self):
+        """(arrays, info): numpy arrays for the .npz and JSON-serializable lists"""
+        product_fields = list(self.product_fields.items())
+        vector_fields = list(self.vector_fields.items())
+        arrays = {"product_rows": self.product_rows, "suffix_codes": self.suffix_codes}
+        arrays.update({f"product_field_{i}": codes for i, (_, (codes, _)) in enumerate(product_fields)})
+        arrays.update({f"vector_field_{i}": codes for i, (_, (codes, _)) in enumerate(vector_fields)})
+        info = {
+            "product_ids": self.product_ids,
+            "suffixes": self.suffixes,
+            "product_fields": [[name, uniques] for name, (_, uniques) in product_fields],
+            "vector_fields": [[name, uniques] for name, (_, uniques) in vector_fields],
+        }
+        return arrays, info
+
+    @classmethod
+    def from_state(cls, arrays, info):
+        return cls(
+            info["product_ids"],
+            arrays["product_rows"],
+            info["suffixes"],
+            arrays["suffix_codes"],
+            {name: (arrays[f"product_field_{i}"], uniques)
+             for i, (name, uniques) in enumerate(info["product_fields"])},
+            {name: (arrays[f"vector_field_{i}"], uniques)
+             for i, (name, uniques) in enumerate(info["vector_fields"])},
+        )
+
+
+# ----- Index -----
+class CompressedIndex:
+    """Read-only in-memory index over compressed codes with exact rerank of the shortlist
+
+    Implements the subset of the Pinecone Index API used by chatbot_backend.py
+    and load_vectordb.evaluate_retrieval (query / describe_index_stats).
+    """
+
+    def __init__(self, codec, codes, metadata, dimension, full_vectors=None,
+                 rerank_factor=RERANK_FACTOR, model=None):
+        self.codec = codec
+        self.dimension = dimension
+        self.model = model  # Embedding model that produced the vectors, if known
+        self.codes = codes
+        self.metadata = metadata  # ColumnarMetadata: ids and metadata of every vector
+        self.full_vectors = full_vectors  # float32, normalized; None disables rerank
+        self.rerank_factor = rerank_factor
+        self._filter_masks = {}
+
+    @classmethod
+    def from_vectors(cls, vectors, codec="pq", rerank=True, model=None, **codec_kwargs):
+        """Train `codec` and encode Pinecone-format vectors (see load_vectordb.embeddings_to_vectors)"""
+        if isinstance(codec, str):
+            codec = CODECS[codec](**codec_kwargs)
+        matrix = normalize([v["values"] for v in vectors])
+        codec.train(matrix)
+        return cls(
+            codec,
+            codes=codec.encode(matrix),
+            metadata=ColumnarMetadata.from_lists([v["id"] for v in vectors],
+                                                 [v.get("metadata", {}) for v in vectors]),
+            dimension=matrix.shape[1],
+            full_vectors=matrix if rerank else None,
+            model=model,
+        )
+
+    def save(self, path):
+        """Write codes, codec state and metadata, plus the float32 vectors used for rerank"""
+        os.makedirs(path, exist_ok=True)
+        meta_arrays, meta_info = self.metadata.state()
+        np.savez(os.path.join(path, "codes.npz"), codes=self.codes,
+                 **{f"codec_{key}": value for key, value in self.codec.state().items()},
+                 **{f"meta_{key}": value for key, value in meta_arrays.items()})
+        with open(os.path.join(path, "index.json"), "w") as f:
+            json.dump({"codec": self.codec.name, "model": self.model, "dimension": self.dimension,
+                       **meta_info}, f)
+        if self.full_vectors is not None:
+            np.save(os.path.join(path, "vectors.f32.npy"), np.asarray(self.full_vectors))
+
+    @classmethod
+    def load(cls, path, rerank=True, rerank_factor=RERANK_FACTOR):
+        """Load a saved index; rerank vectors are memory-mapped rather than read into RAM"""
+        with open(os.path.join(path, "index.json")) as f:
+            info = json.load(f)
+        with np.load(os.path.join(path, "codes.npz")) as data:
+            codes = data["codes"]
+            state = {key[len("codec_"):]: data[key] for key in data.files if key.startswith("codec_")}
+            meta_arrays = {key[len("meta_"):]: data[key] for key in data.files if key.startswith("meta_")}
+        codec = CODECS[info["codec"]]().load_state(state)
+        if "ids" in info:  # Saved before metadata was columnar
+            metadata = ColumnarMetadata.from_lists(info["ids"], info["metadata"])
+        else:
+            metadata = ColumnarMetadata.from_state(meta_arrays, info)
+
+        full_vectors = None
+        vectors_path = os.path.join(path, "vectors.f32.npy")
+        if rerank and os.path.exists(vectors_path):
+            full_vectors = np.load(vectors_path, mmap_mode="r")
+        return cls(codec, codes, metadata, info["dimension"],
+                   full_vectors, rerank_factor, info.get("model"))
+
+    def memory_usage(self):
+        """In-RAM bytes by component; rerank vectors count only when not memory-mapped"""
+        rerank = 0
+        if self.full_vectors is not None and not isinstance(self.full_vectors, np.memmap):
+            rerank = self.full_vectors.nbytes
+        codec = sum(np.asarray(value).nbytes for value in self.codec.state().values())
+        return {"codes": self.codes.nbytes, "codec": codec, "rerank": rerank,
+                "metadata": self.metadata.nbytes()}
+
+    def memory_bytes_per_vector(self):
+        """Total in-RAM bytes per vector: codes, codec tables, ids and metadata, in-RAM rerank vectors"""
+        return sum(self.memory_usage().values()) / max(len(self.metadata), 1)
+
+    def _mask(self, filter):
+        if not filter:
+            return None
+        key = json.dumps(filter, sort_keys=True)
+        if key not in self._filter_masks:
+            self._filter_masks[key] = self.metadata.mask(filter)
+        return self._filter_masks[key]
+
+    def query(self, vector, top_k=10, include_metadata=False, filter=None, **kwargs):
+        query = normalize(vector)
+        mask = self._mask(filter)
+        candidates = np.arange(len(self.metadata)) if mask is None else np.flatnonzero(mask)
+        if len(candidates) == 0:
+            return {"matches": []}
+
+        # Filtered rows are gathered block by block, never copied as a whole
+        scores = self.codec.scores(self.codes, query, None if mask is None else candidates)
+
+        shortlist_size = top_k * self.rerank_factor if self.full_vectors is not None else top_k
+        shortlist_size = min(shortlist_size, len(candidates))
+        shortlist = np.argpartition(-scores, shortlist_size - 1)[:shortlist_size]
+        rows = candidates[shortlist]
+        scores = scores[shortlist]
+
+        if self.full_vectors is not None:
+            # Exact rerank: sorted rows keep memory-mapped reads sequential
+            order = np.argsort(rows)
+            rows = rows[order]
+            scores = np.asarray(self.full_vectors[rows]) @ query
+
+        k = min(top_k, len(rows))
+        best = np.argsort(-scores)[:k]
+        matches = []
+        for i in best:
+            match = {"id": self.metadata.id(rows[i]), "score": float(scores[i])}
+            if include_metadata:
+                match["metadata"] = self.metadata.get(rows[i])
+            matches.append(match)
+        return {"matches": matches}
+
+    def describe_index_stats(self):
+        return {"dimension": self.dimension, "total_vector_count": len(self.metadata)}
+
+
+# ----- Evaluation -----
+def evaluate_codec(index, baseline, queries, top_k=10):
+    """QPS and recall@k of `index` against the exact `baseline` neighbours"""
+    hits = 0
+    start = time.perf_counter()
+    results = [index.query(vector=q, top_k=top_k, filter=f) for q, f in queries]
+    elapsed = time.perf_counter() - start
+
+    for (q, f), result in zip(queries, results):
+        truth = {m["id"] for m in baseline.query(vector=q, top_k=top_k, filter=f)["matches"]}
+        hits += len(truth & {m["id"] for m in result["matches"]})
+
+    return {
+        "qps": len(queries) / elapsed if elapsed > 0 else 0.0,
+        f"recall@{top_k}": hits / (len(queries) * top_k),
+    }
+
+
+def load_embeddings(args):
+    if args.synthetic:
+        from benchmark import make_synthetic_catalog
+
+        _, embeddings = make_synthetic_catalog(args.synthetic, seed=args.seed)
+        return embeddings
+    print(f"Loading embeddings from {args.embeddings}...")
+    with open(args.embeddings) as f:
+        return json.load(f)
+
+
+def run_evaluate(args):
+    from load_vectordb import embeddings_to_vectors, evaluate_retrieval
+
+    embeddings = load_embeddings(args)
+    vectors = embeddings_to_vectors(embeddings)
+    baseline = CompressedIndex.from_vectors(vectors, "none", rerank=False)
+
+    rng = np.random.default_rng(args.seed)
+    sample = rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)
+    # Perturb stored vectors so queries are near, not identical to, their targets
+    queries = [(np.asarray(vectors[i]["values"], dtype=np.float32)
+                + args.noise * rng.standard_normal(len(vectors[i]["values"])).astype(np.float32),
+                {"type": {"$eq": vectors[i]["metadata"]["type"]}}) for i in sample]
+
+    report = {"vectors": len(vectors), "queries": len(queries), "noise": args.noise, "codecs": []}
+    for name in ["none"] + [c for c in args.codecs if c != "none"]:
+        for rerank in ([False] if name == "none" else [False, True]):
+            print(f"\nCodec: {name} (rerank={rerank})")
+            start = time.perf_counter()
+            index = baseline if name == "none" else CompressedIndex.from_vectors(
+                vectors, name, rerank=rerank, **({"m": args.pq_m} if name == "pq" else {}))
+            build_s = time.perf_counter() - start
+
+            with tempfile.TemporaryDirectory() as saved_path:
+                if rerank:
+                    # Measure what the app serves: rerank vectors memory-mapped, not in RAM
+                    index.save(saved_path)
+                    index = CompressedIndex.load(saved_path)
+
+                usage = index.memory_usage()
+                result = {"codec": name, "rerank": rerank, "build_s": build_s,
+                          "bytes_per_vector": index.memory_bytes_per_vector(),
+                          "code_bytes_per_vector": usage["codes"] / len(vectors),
+                          "metadata_bytes_per_vector": usage["metadata"] / len(vectors),
+                          "mapped_bytes_per_vector": index.dimension * 4 if rerank else 0,
+                          "compression_ratio": baseline.memory_bytes_per_vector() / index.memory_bytes_per_vector()}
+                result.update(evaluate_codec(index, baseline, queries))
+
+                # Same sample for every codec so the load_vectordb numbers are comparable
+                np.random.seed(args.seed)
+                result["load_vectordb_eval"] = evaluate_retrieval(index, embeddings, args.eval_sample_size)
+                del index  # Release the memory map before the directory is removed
+            print(json.dumps({k: v for k, v in result.items() if k != "load_vectordb_eval"}))
+            report["codecs"].append(result)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+
+def run_build(args):
+    from load_vectordb import embeddings_to_vectors
+    from embedding_versions import CLIP_MODEL_NAME
+
+    vectors = embeddings_to_vectors(load_embeddings(args))
+    print(f"Training {args.codec} codec on {len(vectors)} vectors...")
+    index = CompressedIndex.from_vectors(vectors, args.codec, model=args.model or CLIP_MODEL_NAME,
+                                         **({"m": args.pq_m} if args.codec == "pq" else {}))
+    index.save(args.output)
+    print(f"Saved {len(vectors)} vectors ({index.memory_bytes_per_vector():.0f} bytes/vector in memory) "
+          f"to {args.output}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compressed local vector index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_common(p):
+        p.add_argument("--embeddings", default="embeddings/all_embeddings.json")
+        p.add_argument("--synthetic", type=int, default=0,
+                       help="Use N synthetic products from benchmark.py instead of --embeddings")
+        p.add_argument("--pq-m", type=int, default=64, help="PQ sub-vectors (bytes per vector)")
+        p.add_argument("--seed", type=int, default=0)
+
+    build = subparsers.add_parser("build", help="Build and save a compressed index")
+    add_common(build)
+    build.add_argument("--codec", choices=list(CODECS), default="pq")
+    build.add_argument("--output", default="vectordb/compressed")
+    build.add_argument("--model", help="Model that produced the embeddings (default: CLIP_MODEL_NAME)")
+
+    evaluate = subparsers.add_parser("evaluate", help="Compare codecs against the uncompressed baseline")
+    add_common(evaluate)
+    evaluate.add_argument("--codecs", nargs="+", choices=list(CODECS), default=["float16", "int8", "pq"])
+    evaluate.add_argument("--queries", type=int, default=200)
+    evaluate.add_argument("--noise", type=float, default=0.02,
+                          help="Gaussian noise added to sampled vectors to form queries")
+    evaluate.add_argument("--eval-sample-size", type=int, default=100,
+                          help="Sample size for load_vectordb.evaluate_retrieval")
+    evaluate.add_argument("--output", default="compression_report.json")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == "build":
+        run_build(args)
+    else:
+        run_evaluate(args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())